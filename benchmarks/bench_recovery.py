@@ -0,0 +1,81 @@
+"""
+Benchmark SongTracker snapshot writes and crash recovery on a large history.
+
+The script exits with status 1 if recovery loses rows, or leaves a damaged
+snapshot in one of the generations instead of moving it aside.
+
+Usage:
+    python benchmarks/bench_recovery.py [rows]
+"""
+import hashlib
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import numpy as np
+import pandas as pd
+
+from definitions import SNAPSHOT_GENERATIONS
+from song_tracker import SongTracker
+
+
+def damaged_generations(csv_path: Path) -> list[str]:
+    """Return the names of snapshot generations whose checksum does not match."""
+    damaged = []
+    for path in [csv_path] + [csv_path.with_name(f"{csv_path.name}.{i}") for i in range(1, SNAPSHOT_GENERATIONS + 1)]:
+        checksum_path = path.with_name(path.name + ".sha256")
+        if not path.exists() or not checksum_path.exists():
+            continue
+        if hashlib.sha256(path.read_bytes()).hexdigest() != checksum_path.read_text(encoding="utf-8").split()[0]:
+            damaged.append(path.name)
+    return damaged
+
+
+def main(rows: int = 2_000_000) -> None:
+    """Write a synthetic history, damage the newest snapshot and time recovery."""
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        csv_path = tmp_dir / "songs.csv"
+        tracker = SongTracker(str(csv_path))
+        ids = np.char.add("song", np.arange(rows).astype(str))
+        tracker.df = pd.DataFrame({"Song": ids, "Artists": "['Artist']", "Count": 1},
+                                  index=pd.Index(ids, name="Song_ID"))
+
+        start = time.perf_counter()
+        tracker._save_csv()
+        tracker._save_csv()
+        print(f"snapshot write: {(time.perf_counter() - start) / 2:.2f}s per save for {rows} rows")
+
+        start = time.perf_counter()
+        SongTracker(str(csv_path))
+        print(f"clean load:     {time.perf_counter() - start:.2f}s")
+
+        # Simulate a crash mid-write by truncating the newest snapshot
+        data = csv_path.read_bytes()
+        csv_path.write_bytes(data[:len(data) // 2])
+        start = time.perf_counter()
+        recovered = SongTracker(str(csv_path))
+        print(f"recovery:       {time.perf_counter() - start:.2f}s ({len(recovered.df)} rows restored)")
+
+        failures = []
+        if len(recovered.df) != rows:
+            failures.append(f"{len(recovered.df)} of {rows} rows restored")
+        damaged = damaged_generations(csv_path)
+        if damaged:
+            failures.append(f"damaged snapshots left in generations: {', '.join(damaged)}")
+        if not list(tmp_dir.glob("songs.csv.corrupt-*")):
+            failures.append("damaged snapshot was not moved aside")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    if failures:
+        print(f"FAILED: {'; '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000)
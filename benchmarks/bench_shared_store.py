@@ -0,0 +1,85 @@
+"""
+Benchmark concurrent SongTracker writers sharing one CSV file.
+
+Each worker process plays the same set of songs, recording some of the plays
+through ``merge_counts``. With the shared store the final counts must equal
+the total number of plays across all workers; the script exits with status 1
+otherwise. The unlocked run is only shown for comparison.
+
+Usage:
+    python benchmarks/bench_shared_store.py [workers] [plays_per_worker]
+"""
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import pandas as pd
+
+from logger import logger
+from song_tracker import SongTracker
+
+SONG_POOL = 50
+
+
+def play_songs(csv_path: str, plays: int, shared: bool) -> int:
+    """Record ``plays`` plays spread over a fixed pool of songs and return the number of failed saves.
+
+    Every tenth play is merged as an aggregated count, alternating between a
+    song from the pool and a song new to the store.
+    """
+    logger.setLevel(logging.CRITICAL)
+    tracker = SongTracker(csv_path, shared=shared)
+    failures = 0
+    for i in range(plays):
+        song_id = f"song{i % SONG_POOL}"
+        try:
+            if i % 10 == 0:
+                merged_id = song_id if i % 20 == 0 else f"merged-{os.getpid()}-{i}"
+                tracker.merge_counts(pd.DataFrame({"Song": [merged_id], "Artists": [["Artist"]], "Count": [1]},
+                                                  index=pd.Index([merged_id], name="Song_ID")))
+            else:
+                tracker.add_song(song_id, song_id, ["Artist"])
+        except OSError:
+            failures += 1
+    return failures
+
+
+def run(workers: int, plays: int, shared: bool) -> tuple[float, int, int]:
+    """Run the workers against a fresh store and return elapsed time, final play total and failed saves."""
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        csv_path = str(tmp_dir / "songs.csv")
+        SongTracker(csv_path, shared=shared)
+        start = time.perf_counter()
+        with Pool(workers) as pool:
+            failures = sum(pool.starmap(play_songs, [(csv_path, plays, shared)] * workers))
+        elapsed = time.perf_counter() - start
+        return elapsed, int(SongTracker(csv_path).df["Count"].sum()), failures
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def main(workers: int = 4, plays: int = 200) -> None:
+    """Compare unlocked and shared writers on the same workload."""
+    logger.setLevel(logging.CRITICAL)
+    expected = workers * plays
+    for shared in (False, True):
+        elapsed, total, failures = run(workers, plays, shared)
+        mode = "shared  " if shared else "unlocked"
+        print(f"{mode}: {elapsed:.2f}s, {elapsed / expected * 1000:.2f}ms per play, "
+              f"{total}/{expected} plays recorded, {failures} failed saves")
+
+    if total != expected or failures:
+        print(f"FAILED: shared store recorded {total} of {expected} plays with {failures} failed saves")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
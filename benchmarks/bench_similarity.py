@@ -0,0 +1,81 @@
+"""
+Benchmark similarity index updates and queries on a synthetic library.
+
+Usage:
+    python benchmarks/bench_similarity.py [tracks] [plays]
+"""
+import logging
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import numpy as np
+
+from logger import logger
+from similarity_index import SimilarityIndex
+
+ARTISTS = 5_000
+GENRES = 300
+
+
+class SyntheticMetadata:
+    """Stand-in for MetadataCache returning one artist per track and two genres per artist."""
+
+    def get(self, kind: str, item_id: str) -> dict:
+        number = int(item_id[1:])
+        if kind == "track":
+            return {"artist_ids": [f"a{number % ARTISTS}"]}
+        return {"genres": [f"g{number % GENRES}", f"g{number % 17}"]}
+
+
+def timed_ms(func, repeat: int = 20) -> float:
+    """Return the mean run time of ``func`` in milliseconds after one warm-up call."""
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(tracks: int = 100_000, plays: int = 600_000) -> None:
+    """Build an index from random listening sessions and time the queries."""
+    logger.setLevel(logging.WARNING)
+    rng = np.random.default_rng(0)
+    index = SimilarityIndex()
+
+    played_at = 0.0
+    start = time.perf_counter()
+    for n, track in enumerate(rng.integers(0, tracks, plays).tolist()):
+        played_at += 200 if n % 20 else 4000  # A new session every 20 plays
+        index.observe_play(f"t{track}", [f"a{track % ARTISTS}"], played_at)
+    elapsed = time.perf_counter() - start
+    print(f"observe_play:           {elapsed / plays * 1e6:.1f}us per play ({len(index.track_ids)} tracks)")
+
+    start = time.perf_counter()
+    index.build_content_features(SyntheticMetadata())
+    print(f"build_content_features: {time.perf_counter() - start:.2f}s")
+
+    seed = index.track_ids[0]
+    print(f"similar_tracks:         {timed_ms(lambda: index.similar_tracks(seed)):.3f}ms")
+    print(f"similar_artists:        {timed_ms(lambda: index.similar_artists('a0')):.3f}ms")
+    print(f"recommend:              {timed_ms(lambda: index.recommend()):.3f}ms")
+
+    tmp_dir = Path(tempfile.mkdtemp())
+    try:
+        path = str(tmp_dir / "index.npz")
+        start = time.perf_counter()
+        index.save(path)
+        print(f"save:                   {time.perf_counter() - start:.2f}s")
+        start = time.perf_counter()
+        SimilarityIndex.load(path)
+        print(f"load:                   {time.perf_counter() - start:.2f}s")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
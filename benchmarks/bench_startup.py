@@ -0,0 +1,56 @@
+"""
+Benchmark the cold import time of the tracker entry point against a startup budget.
+
+Each run imports ``main`` in a fresh interpreter and checks that dependencies
+reserved for later features (pandas, the OAuth flow) were not loaded. The
+script exits with status 1 if the median import time exceeds the budget or a
+deferred dependency was imported.
+
+Usage:
+    python benchmarks/bench_startup.py [runs] [budget_ms]
+"""
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+STARTUP_BUDGET_MS = 200
+DEFERRED_MODULES = ("pandas", "numpy", "requests_oauthlib", "webbrowser", "auth_server", "song_tracker")
+
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{"elapsed_ms": elapsed_ms,
+                  "loaded": [m for m in {DEFERRED_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def measure_once() -> dict:
+    """Import ``main`` in a fresh interpreter and return its timing and deferred modules loaded."""
+    result = subprocess.run([sys.executable, "-c", PROBE], cwd=SRC_DIR,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(runs: int = 10, budget_ms: float = STARTUP_BUDGET_MS) -> None:
+    """Measure import time over several runs and compare the median to the budget."""
+    measure_once()  # Warm the bytecode cache so runs measure imports, not compilation
+    samples = [measure_once() for _ in range(runs)]
+    times = [sample["elapsed_ms"] for sample in samples]
+    loaded = sorted({module for sample in samples for module in sample["loaded"]})
+    median = statistics.median(times)
+
+    print(f"import main: median {median:.1f}ms, min {min(times):.1f}ms, max {max(times):.1f}ms "
+          f"over {runs} runs (budget {budget_ms:.0f}ms)")
+    if loaded:
+        print(f"deferred modules imported at startup: {', '.join(loaded)}")
+    if median > budget_ms or loaded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*(float(arg) if i else int(arg) for i, arg in enumerate(sys.argv[1:3])))
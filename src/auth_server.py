@@ -2,19 +2,27 @@
 Authentication server for handling Spotify OAuth2 flow.
 
 This module provides functionality for obtaining user authorization
-and handling the OAuth2 callback from Spotify.
+and handling the OAuth2 callback from Spotify. A single long-lived
+callback server can serve many authorization flows at once; each flow
+is correlated by its OAuth2 ``state`` and resolved through a future.
 """
 
+import threading
 import webbrowser
-from http.server import BaseHTTPRequestHandler, HTTPServer
-from urllib.parse import parse_qs
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
 
 from requests_oauthlib import OAuth2Session
 
 from definitions import REDIRECT_URI, AUTH_URL, CLI_ID
 from logger import logger
+from models import AuthorizationRequest
 
 class CallbackHandler(BaseHTTPRequestHandler):
+    server: "CallbackServer"
+
     def log_message(self, format: str, *args) -> None:
         """Override default logging to use our logger."""
         logger.info("%s - %s", self.address_string(), format % args)
@@ -22,21 +30,35 @@ class CallbackHandler(BaseHTTPRequestHandler):
     def do_GET(self) -> None:
         """Handle GET request from Spotify OAuth callback."""
         try:
+            url = urlparse(self.path)
+            if url.path != self.server.callback_path:
+                self.send_error(404, "Not found")
+                return
+
             # Parse query parameters
-            query_components = parse_qs(self.path[10:])  # Remove leading '/?'
+            query_components = parse_qs(url.query)
             logger.debug(f"Received callback with query params: {query_components}")
-            
+
+            # Match the callback to a pending authorization flow
+            state = query_components.get('state', [''])[0]
+            future = self.server.pop_pending(state)
+            if future is None:
+                logger.warning("Received callback with unknown or expired state")
+                self.send_error(400, "Unknown or expired authorization request")
+                return
+
             # Check for error response from Spotify
             if 'error' in query_components:
                 error = query_components.get('error', ['Unknown error'])[0]
                 error_desc = query_components.get('error_description', [''])[0]
                 logger.error(f"Spotify authorization error: {error} - {error_desc}")
                 self.send_error(400, f"Authorization failed: {error}")
+                future.set_exception(RuntimeError(f"Authorization failed: {error}"))
                 return
-                
+
             # Check for authorization code
+            # Respond before resolving the flow: resolving the last flow may stop the server
             if 'code' in query_components:
-                self.server.code = query_components['code']
                 logger.info("Successfully received authorization code")
                 self.send_response(200)
                 self.send_header('Content-type', 'text/html')
@@ -47,33 +69,80 @@ class CallbackHandler(BaseHTTPRequestHandler):
                     b'<p>You can close this window now.</p>'
                     b'</body></html>'
                 )
+                future.set_result(query_components['code'][0])
             else:
                 logger.warning("Received callback without code parameter")
                 self.send_error(400, "Missing authorization code")
-                
+                future.set_exception(RuntimeError("Missing authorization code"))
+
         except Exception as e:
             logger.exception("Error processing callback:")
             self.send_error(500, f"Internal server error: {str(e)}")
 
+class CallbackServer(ThreadingHTTPServer):
+    """HTTP server that routes OAuth2 callbacks to pending flows by state.
+
+    Args:
+        address: Host and port to listen on
+        callback_path: URL path of the redirect URI
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], callback_path: str) -> None:
+        """Initialize the server with an empty set of pending flows."""
+        super().__init__(address, CallbackHandler)
+        self.callback_path = callback_path
+        self._pending: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def add_pending(self, state: str, future: Future) -> None:
+        """Register a future to be resolved by the callback carrying ``state``."""
+        with self._lock:
+            self._pending[state] = future
+
+    def pop_pending(self, state: str) -> Optional[Future]:
+        """Remove and return the future registered for ``state``, if any."""
+        with self._lock:
+            return self._pending.pop(state, None)
+
+    def cancel_pending(self) -> None:
+        """Fail every pending flow, e.g. when the server shuts down."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError("Authorization server stopped"))
+
 class AuthServer:
     """Handles Spotify OAuth2 authentication flow.
-    
+
     This class manages the OAuth2 authorization code flow with Spotify's API,
-    including generating authorization URLs and handling the callback.
-    
+    including generating authorization URLs and handling the callback. The
+    callback server runs in a background thread, so any number of flows can
+    be in progress at once without blocking their callers.
+
     Args:
         scope: Space-separated string of Spotify authorization scopes
-        host: Hostname for the callback server (default: 127.0.0.1)
-        port: Port for the callback server (default: 3000)
+        host: Hostname for the callback server (default: taken from REDIRECT_URI, else 127.0.0.1)
+        port: Port for the callback server (default: taken from REDIRECT_URI, else 3000)
     """
-    
-    def __init__(self, scope: str, host: str = "127.0.0.1", port: int = 3000) -> None:
+
+    def __init__(self, scope: str, host: Optional[str] = None, port: Optional[int] = None) -> None:
         """Initialize the AuthServer with the specified scopes and server configuration."""
+        redirect = urlparse(REDIRECT_URI or "")
         self.scope = scope
-        self.host = host
-        self.port = port
+        self.host = host or redirect.hostname or "127.0.0.1"
+        self.port = port or redirect.port or 3000
+        self.callback_path = redirect.path or "/callback"
+        self._server: Optional[CallbackServer] = None
+        self._server_thread: Optional[threading.Thread] = None
+        # Reentrant: stopping fails pending flows, whose callbacks update the flow count
+        self._lock = threading.RLock()
+        self._active_flows = 0      # Flows whose code future is not resolved yet
+        self._owns_server = False   # Whether a flow started the server, which then stops with the last flow
         self._validate_scopes()
-        
+
     def _validate_scopes(self) -> None:
         """Validate that the provided scopes are valid Spotify scopes."""
         valid_scopes = {
@@ -84,114 +153,178 @@ class AuthServer:
             'streaming', 'app-remote-control', 'user-library-read',
             'user-library-modify', 'user-follow-read', 'user-follow-modify'
         }
-        
+
         for scope in self.scope.split():
             if scope not in valid_scopes:
                 logger.warning(f"Unknown scope: {scope}")
 
-    def get_auth_url(self) -> str:
+    @property
+    def running(self) -> bool:
+        """Whether the callback server is currently accepting requests."""
+        return self._server is not None
+
+    def start(self) -> None:
+        """Start the callback server in a background thread if it is not running yet.
+
+        Raises:
+            RuntimeError: If the server cannot bind to its host and port
+        """
+        with self._lock:
+            self._start_locked()
+
+    def stop(self) -> None:
+        """Stop the callback server and fail any flows still waiting for a code."""
+        with self._lock:
+            self._owns_server = False
+            self._stop_locked()
+
+    def _start_locked(self) -> bool:
+        """Start the callback server; the caller must hold ``self._lock``.
+
+        Returns:
+            bool: True if the server was started, False if it was already running
+        """
+        if self._server is not None:
+            return False
+        try:
+            self._server = CallbackServer((self.host, self.port), self.callback_path)
+        except OSError as e:
+            raise RuntimeError(f"Failed to start callback server on {self.host}:{self.port}: {e}") from e
+        self._server_thread = threading.Thread(target=self._server.serve_forever,
+                                               name="auth-callback-server",
+                                               daemon=True)
+        self._server_thread.start()
+        logger.info(f"Waiting for authorization callbacks on http://{self.host}:{self.port}{self.callback_path}")
+        return True
+
+    def _stop_locked(self) -> None:
+        """Stop the callback server; the caller must hold ``self._lock``.
+
+        The lock stays held until the socket is closed, so a concurrent start
+        cannot fail to bind the port that is being released.
+        """
+        server, self._server = self._server, None
+        thread, self._server_thread = self._server_thread, None
+        if server is None:
+            return
+        server.shutdown()
+        server.server_close()
+        server.cancel_pending()
+        if thread is not None:
+            thread.join(timeout=1)
+        logger.info("Authorization callback server stopped")
+
+    def _exit_flow(self, future: Future) -> None:
+        """Unregister a resolved or cancelled flow; the last one stops a server the flows started."""
+        with self._lock:
+            self._active_flows -= 1
+            if self._active_flows == 0 and self._owns_server:
+                self._owns_server = False
+                self._stop_locked()
+
+    def __enter__(self) -> "AuthServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def get_auth_url(self, scope: Optional[str] = None) -> tuple[str, str]:
         """
         Generate the Spotify authorization URL.
-        
+
+        Args:
+            scope: Space-separated scopes for this flow (default: the server's scopes)
+
         Returns:
-            str: The URL to redirect users to for Spotify authorization
-            
+            tuple[str, str]: The URL to redirect users to for Spotify authorization and its state
+
         Raises:
             RuntimeError: If there's an error generating the authorization URL
         """
         try:
             o2auth = OAuth2Session(
                 client_id=CLI_ID,
-                scope=self.scope,
+                scope=scope or self.scope,
                 redirect_uri=REDIRECT_URI
             )
-            auth_url, _ = o2auth.authorization_url(AUTH_URL)
-            return auth_url
+            return o2auth.authorization_url(AUTH_URL)
         except Exception as e:
             logger.error(f"Failed to generate auth URL: {str(e)}")
             raise RuntimeError(f"Failed to generate authorization URL: {str(e)}")
 
-    def callback(self, timeout: int = 120) -> str:
+    def begin_authorization(self, scope: Optional[str] = None) -> AuthorizationRequest:
+        """
+        Start a new authorization flow without waiting for it to complete.
+
+        The callback server is started if needed. The returned request's
+        ``code`` future resolves to the authorization code once the user
+        completes the flow, or fails if Spotify reports an error. A server
+        started by a flow is stopped once no flow is outstanding; a server
+        started with ``start`` keeps running.
+
+        Args:
+            scope: Space-separated scopes for this flow (default: the server's scopes)
+
+        Returns:
+            AuthorizationRequest: The authorization URL, its state and the code future
+        """
+        auth_url, state = self.get_auth_url(scope)
+        future: Future = Future()
+        with self._lock:
+            if self._start_locked():
+                self._owns_server = True
+            self._server.add_pending(state, future)
+            self._active_flows += 1
+        future.add_done_callback(self._exit_flow)
+        return AuthorizationRequest(auth_url=auth_url, state=state, code=future)
+
+    def cancel_authorization(self, request: AuthorizationRequest) -> None:
+        """Stop waiting for the callback of ``request``."""
+        with self._lock:
+            if self._server is not None:
+                self._server.pop_pending(request.state)
+        request.code.cancel()
+
+    def callback(self, timeout: int = 120, scope: Optional[str] = None) -> str:
         """
         Handle the OAuth2 authorization code flow.
-        
+
         This method will:
-        1. Open the user's default browser to the Spotify authorization page
-        2. Start a local HTTP server to handle the OAuth2 callback
+        1. Start the callback server if it is not running yet
+        2. Open the user's default browser to the Spotify authorization page
         3. Wait for the user to complete the authorization
         4. Return the authorization code
-        
+
+        Only the calling thread waits; other flows and the callback server
+        keep running. A server started by a flow is stopped once no flow is
+        outstanding; a server started with ``start`` keeps running.
+
         Args:
             timeout: Maximum time in seconds to wait for authorization (default: 120)
-            
+            scope: Space-separated scopes for this flow (default: the server's scopes)
+
         Returns:
             str: The authorization code from Spotify
-            
+
         Raises:
-            RuntimeError: If the authorization process fails or times out
+            RuntimeError: If the authorization process fails
             TimeoutError: If the authorization process takes longer than the specified timeout
         """
-        import time
-        from threading import Thread
-        
-        class ServerThread(Thread):
-            """Helper class to run the HTTP server in a separate thread."""
-            def __init__(self, host: str, port: int):
-                super().__init__(daemon=True)
-                self.host = host
-                self.port = port
-                self.server = None
-                self.error = None
-                
-            def run(self):
-                try:
-                    self.server = HTTPServer((self.host, self.port), CallbackHandler)
-                    self.server.timeout = 1  # Short timeout to allow for keyboard interrupt
-                    while not hasattr(self.server, 'code') and not hasattr(self, 'stop_flag'):
-                        self.server.handle_request()
-                except Exception as e:
-                    self.error = e
-                finally:
-                    if self.server:
-                        self.server.server_close()
-        
+        request = self.begin_authorization(scope)
         try:
-            # Start the server in a separate thread
-            server_thread = ServerThread(self.host, self.port)
-            
-            # Get the authorization URL and open the browser
-            auth_url = self.get_auth_url()
-            logger.info(f"Initiating OAuth2 flow. Opening browser to: {auth_url}")
-            webbrowser.open(auth_url)
-            server_thread.run()
-            
-            # Wait for the authorization code with timeout
-            logger.info(f"Waiting for authorization on http://{self.host}:{self.port}")
-            start_time = time.time()
-            
-            while not hasattr(server_thread, 'server') or not hasattr(server_thread.server, 'code'):
-                if server_thread.error:
-                    raise RuntimeError(f"Server error: {server_thread.error}")
-                    
-                if time.time() - start_time > timeout:
-                    raise TimeoutError(f"Authorization timed out after {timeout} seconds")
-                    
-                time.sleep(0.1)
-            
-            # Get the authorization code
-            auth_code = server_thread.server.code
-            if isinstance(auth_code, list):
-                auth_code = auth_code[0]
-                
+            logger.info(f"Initiating OAuth2 flow. Opening browser to: {request.auth_url}")
+            webbrowser.open(request.auth_url)
+            auth_code = request.code.result(timeout=timeout)
             logger.info("Successfully obtained authorization code")
             return auth_code
-            
+
+        except FutureTimeoutError:
+            self.cancel_authorization(request)
+            logger.error(f"Authorization timed out after {timeout} seconds")
+            raise TimeoutError(f"Authorization timed out after {timeout} seconds")
+
         except Exception as e:
+            self.cancel_authorization(request)
             logger.error(f"Authorization failed: {str(e)}", exc_info=True)
             raise RuntimeError(f"Authorization failed: {str(e)}") from e
-            
-        finally:
-            # Ensure the server thread is stopped
-            if 'server_thread' in locals() and server_thread.is_alive():
-                server_thread.stop_flag = True
-                server_thread.join(timeout=1)
@@ -7,6 +7,17 @@ CLI_ID = os.getenv("CLIENT_ID")
 SECRET_ID = os.getenv("CLIENT_SECRET")
 REDIRECT_URI = os.getenv("REDIRECT_URI")
 
+# Headless bootstrap: pre-obtained credentials skip the browser login
+SPOTIFY_REFRESH_TOKEN = os.getenv("SPOTIFY_REFRESH_TOKEN")
+SPOTIFY_AUTH_CODE = os.getenv("SPOTIFY_AUTH_CODE")
+HEADLESS = os.getenv("SPOTIFY_HEADLESS", "").lower() in ("1", "true", "yes")
+
+# Shared storage: lock the song file so several tracker processes can write to it
+SHARED_STORE = os.getenv("SPOTIFY_SHARED_STORE", "").lower() in ("1", "true", "yes")
+
+# Play event sinks, e.g. "file:../Data/plays.ndjson,unix:/tmp/plays.sock,webhook:http://127.0.0.1:8080/plays,index:../Data/similarity_index.npz"
+EVENT_SINKS = os.getenv("SPOTIFY_EVENT_SINKS", "")
+
 #AUTH
 TOKEN_URL = 'https://accounts.spotify.com/api/token'
 AUTH_URL = 'https://accounts.spotify.com/authorize'
@@ -14,15 +25,48 @@ AUTH_URL = 'https://accounts.spotify.com/authorize'
 #API ENDPOINTS
 SEARCH_ENDPOINT = 'https://api.spotify.com/v1/search?'
 CURRENTLY_PLAYING_ENDPOINT = 'https://api.spotify.com/v1/me/player/currently-playing'
+SEVERAL_TRACKS_ENDPOINT = 'https://api.spotify.com/v1/tracks'
+SEVERAL_ARTISTS_ENDPOINT = 'https://api.spotify.com/v1/artists'
 
 #PATHS
 SONGS_CSV_PATH = '../Data/songs.csv'
+METADATA_CACHE_PATH = '../Data/metadata_cache.jsonl'
+SIMILARITY_INDEX_PATH = '../Data/similarity_index.npz'
+PROFILE_DIR = '../Data/profiles'
+TOKEN_STORE_PATH = os.getenv("SPOTIFY_TOKEN_FILE", '../Data/tokens.json')
 
 # Application settings
 SONG_ACCEPTANCE_TIME_MS = 40_000  # Time in ms after which a song is considered "played"
 DEFAULT_REQUEST_TIMEOUT_SEC = 5    # Default timeout for API requests
+AUTH_TIMEOUT_SEC = 120             # Maximum wait for a user to complete authorization
+TOKEN_POLL_INTERVAL_SEC = 2        # Delay between token store checks in headless mode
+
+# Storage settings
+SNAPSHOT_GENERATIONS = 3           # Number of previous song file snapshots kept for recovery
 
 # Tracker settings
 LOOP_DELAY_SECONDS = 5             # Delay between checks for song changes
 MAX_RETRIES = 3                    # Maximum number of retry attempts for API calls
-RETRY_DELAY_SECONDS = 2            # Delay between retry attempts
\ No newline at end of file
+RETRY_DELAY_SECONDS = 2            # Delay between retry attempts
+
+# Enrichment settings
+SEVERAL_ITEMS_LIMIT = 50           # Maximum number of IDs accepted by the batch endpoints
+ENRICH_MAX_WORKERS = 4             # Number of concurrent batch requests during enrichment
+METADATA_TTL_SEC = 7 * 24 * 3600   # Age after which cached metadata is refreshed
+
+# Event settings
+EVENT_BUFFER_SIZE = 1000           # Maximum number of undelivered events kept per sink
+EVENT_BATCH_SIZE = 100             # Maximum number of events delivered to a sink at once
+EVENT_FLUSH_INTERVAL_SEC = 1       # Maximum time an event waits for its batch to fill
+EVENT_RETRY_INITIAL_SEC = 1        # Delay before retrying a failed delivery, doubled per failure
+EVENT_RETRY_MAX_SEC = 60           # Maximum delay between delivery retries
+
+# Similarity index settings
+CO_LISTEN_WINDOW = 5               # Number of preceding plays in a session linked to each play
+SESSION_GAP_SEC = 30 * 60          # Pause after which a new listening session starts
+FEATURE_DIM = 64                   # Size of the hashed genre/artist embedding
+INDEX_SAVE_INTERVAL_SEC = 300      # Minimum time between saves of the similarity index
+
+# Profiling settings
+PROFILE_WINDOW_SEC = 60            # Length of an on-demand profiling session
+PROFILE_SAMPLE_INTERVAL_SEC = 0.01 # Time between stack samples
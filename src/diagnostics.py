@@ -0,0 +1,269 @@
+"""
+On-demand profiling of the tracking loop.
+
+A profiling session runs for a bounded window and writes its results to
+files for offline analysis:
+
+- ``<prefix>-stacks.folded``: sampled stacks of the tracking thread in the
+  collapsed format used by flame graph tools
+- ``<prefix>-phases.json``: per-phase timing breakdown (HTTP, parse, state
+  machine, persistence), each phase timed exclusive of nested phases
+- ``<prefix>-memory.txt``: top allocation sites and store memory usage
+- ``<prefix>-tracemalloc.bin``: the raw tracemalloc snapshot
+
+Run this module with a profile prefix to print a summary of its files.
+"""
+import json
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from definitions import PROFILE_DIR, PROFILE_WINDOW_SEC, PROFILE_SAMPLE_INTERVAL_SEC
+from logger import logger
+
+
+class PhaseTimer:
+    """Collects exclusive wall-clock durations of named phases while enabled.
+
+    When disabled, ``phase`` only costs a flag check.
+    """
+
+    def __init__(self) -> None:
+        """Initialize a disabled timer."""
+        self.enabled = False
+        self._durations: dict[str, list[float]] = defaultdict(list)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Discard previous measurements and start recording."""
+        with self._lock:
+            self._durations = defaultdict(list)
+        self.enabled = True
+
+    def stop(self) -> dict[str, list[float]]:
+        """Stop recording and return the durations in seconds per phase."""
+        self.enabled = False
+        with self._lock:
+            return dict(self._durations)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as phase ``name``, excluding time spent in nested phases.
+
+        Args:
+            name: Phase name, e.g. ``http`` or ``persistence``
+        """
+        if not self.enabled:
+            yield
+            return
+
+        stack = self._local.__dict__.setdefault("stack", [])
+        frame = [0.0]  # Time spent in nested phases
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+            with self._lock:
+                self._durations[name].append(elapsed - frame[0])
+
+
+phase_timer = PhaseTimer()
+
+
+class StackSampler(threading.Thread):
+    """Samples the stack of one thread at a fixed interval and counts collapsed stacks.
+
+    Args:
+        thread_id: Identifier of the thread to sample
+        interval: Time in seconds between samples
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLE_INTERVAL_SEC) -> None:
+        super().__init__(name="stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                names.append(f"{Path(frame.f_code.co_filename).name}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self) -> Counter[str]:
+        """Stop sampling and return the sample count per collapsed stack."""
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+
+class Profiler:
+    """Runs bounded profiling sessions of a thread and writes the results to files.
+
+    Args:
+        output_dir: Directory for profile files
+        memory_report: Callable returning extra lines for the memory report
+        thread_id: Thread to sample (default: the thread creating the profiler)
+    """
+
+    def __init__(self, output_dir: str = PROFILE_DIR,
+                 memory_report: Optional[Callable[[], list[str]]] = None,
+                 thread_id: Optional[int] = None) -> None:
+        """Initialize an idle profiler."""
+        self.output_dir = Path(output_dir)
+        self.memory_report = memory_report
+        self.thread_id = thread_id or threading.get_ident()
+        self._sampler: Optional[StackSampler] = None
+        self._timer: Optional[threading.Timer] = None
+        self._started_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        """Whether a profiling session is running."""
+        return self._sampler is not None
+
+    def start(self, window_sec: float = PROFILE_WINDOW_SEC) -> None:
+        """Start a profiling session that stops itself after ``window_sec`` seconds.
+
+        Requests while a session is running are ignored.
+
+        Args:
+            window_sec: Length of the profiling window in seconds
+        """
+        with self._lock:
+            if self._sampler is not None:
+                logger.warning("Profiling already in progress")
+                return
+            tracemalloc.start()
+            phase_timer.start()
+            self._sampler = StackSampler(self.thread_id)
+            self._sampler.start()
+            self._started_at = time.time()
+            self._timer = threading.Timer(window_sec, self.stop)
+            self._timer.daemon = True
+            self._timer.start()
+        logger.info(f"Profiling started for {window_sec:.0f} seconds")
+
+    def stop(self) -> Optional[Path]:
+        """Stop the running session and write its results.
+
+        Returns:
+            Optional[Path]: Common prefix of the written files, or None if no session was running
+        """
+        with self._lock:
+            sampler, self._sampler = self._sampler, None
+            timer, self._timer = self._timer, None
+            if sampler is None:
+                return None
+            if timer is not None and timer is not threading.current_thread():
+                timer.cancel()
+
+            stacks = sampler.stop()
+            phases = phase_timer.stop()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            duration = time.time() - self._started_at
+
+        prefix = self.output_dir / f"profile-{time.strftime('%Y%m%d-%H%M%S', time.localtime(self._started_at))}"
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            self._write_stacks(prefix, stacks)
+            self._write_phases(prefix, phases, duration)
+            self._write_memory(prefix, snapshot)
+        except Exception as e:
+            logger.error(f"Failed to write profile {prefix}: {e}")
+            return None
+        logger.info(f"Profiling finished, results written to {prefix}-*")
+        return prefix
+
+    @staticmethod
+    def _write_stacks(prefix: Path, stacks: Counter[str]) -> None:
+        with open(f"{prefix}-stacks.folded", "w", encoding="utf-8") as file:
+            for stack, count in stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+    @staticmethod
+    def _write_phases(prefix: Path, phases: dict[str, list[float]], duration: float) -> None:
+        summary = {"window_sec": round(duration, 3), "phases": {}}
+        for name, durations in sorted(phases.items()):
+            ordered = sorted(durations)
+            summary["phases"][name] = {
+                "count": len(ordered),
+                "total_ms": round(sum(ordered) * 1000, 3),
+                "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3),
+            }
+        with open(f"{prefix}-phases.json", "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=2)
+
+    def _write_memory(self, prefix: Path, snapshot: tracemalloc.Snapshot) -> None:
+        snapshot.dump(f"{prefix}-tracemalloc.bin")
+        lines = ["Top allocation sites during the profiling window:"]
+        lines += [f"  {stat}" for stat in snapshot.statistics("lineno")[:30]]
+        if self.memory_report is not None:
+            lines += ["", *self.memory_report()]
+        with open(f"{prefix}-memory.txt", "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+
+
+def summarize(prefix: str, top: int = 15) -> None:
+    """Print the phase breakdown and hottest stacks of a written profile.
+
+    Args:
+        prefix: Common prefix of the profile files
+        top: Number of stacks to show
+    """
+    summary = json.loads(Path(f"{prefix}-phases.json").read_text(encoding="utf-8"))
+    print(f"Window: {summary['window_sec']}s")
+    print(f"{'phase':<14}{'count':>8}{'total ms':>12}{'mean ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, stats in summary["phases"].items():
+        print(f"{name:<14}{stats['count']:>8}{stats['total_ms']:>12.1f}{stats['mean_ms']:>10.2f}"
+              f"{stats['p95_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+
+    samples = []
+    with open(f"{prefix}-stacks.folded", encoding="utf-8") as file:
+        for line in file:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            samples.append((int(count), stack))
+    total = sum(count for count, _ in samples) or 1
+    print(f"\nTop stacks ({total} samples):")
+    for count, stack in samples[:top]:
+        print(f"{count / total:>7.1%}  {';'.join(stack.split(';')[-3:])}")
+
+
+def main() -> None:
+    """Summarize the profile given on the command line, or the newest one in PROFILE_DIR."""
+    if len(sys.argv) > 1:
+        prefix = sys.argv[1]
+    else:
+        profiles = sorted(Path(PROFILE_DIR).glob("profile-*-phases.json"))
+        if not profiles:
+            print(f"No profiles found in {PROFILE_DIR}")
+            sys.exit(1)
+        prefix = str(profiles[-1]).removesuffix("-phases.json")
+    summarize(prefix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Publishing of play events to pluggable sinks.
+
+Each sink is fed by its own background worker through a bounded queue, so a
+slow or unavailable sink never delays polling or the other sinks. Events are
+delivered in batches as newline-delimited JSON. A failed batch is retried
+with exponential backoff while new events wait in the queue; events are
+only dropped when that queue overflows, or when a sink reports that a batch
+can never be delivered.
+"""
+import json
+import queue
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any, Optional
+
+import requests
+
+from definitions import (
+    DEFAULT_REQUEST_TIMEOUT_SEC,
+    EVENT_BUFFER_SIZE,
+    EVENT_BATCH_SIZE,
+    EVENT_FLUSH_INTERVAL_SEC,
+    EVENT_RETRY_INITIAL_SEC,
+    EVENT_RETRY_MAX_SEC
+)
+from logger import logger
+from models import PlayEvent
+
+# Client errors worth retrying: the request timed out or was rate limited
+RETRYABLE_CLIENT_ERRORS = {HTTPStatus.REQUEST_TIMEOUT, HTTPStatus.TOO_MANY_REQUESTS}
+
+
+class PermanentDeliveryError(Exception):
+    """Raised by a sink when a batch can never be delivered, so it is dropped instead of retried."""
+
+
+class EventSink(ABC):
+    """Destination for batches of play events."""
+
+    name = "sink"
+
+    @abstractmethod
+    def send(self, events: list[dict[str, Any]]) -> None:
+        """Deliver a batch of events.
+
+        Args:
+            events: Events as JSON-serializable dictionaries
+
+        Raises:
+            PermanentDeliveryError: If the batch can never be delivered; it is then dropped
+            Exception: If delivery fails otherwise; the batch is then retried
+        """
+
+    def close(self) -> None:
+        """Release resources held by the sink."""
+
+    @staticmethod
+    def _encode(events: list[dict[str, Any]]) -> bytes:
+        """Encode events as newline-delimited JSON."""
+        return "".join(json.dumps(event) + "\n" for event in events).encode("utf-8")
+
+
+class JsonLinesFileSink(EventSink):
+    """Appends events to a newline-delimited JSON file.
+
+    Args:
+        path: Path to the output file
+    """
+
+    name = "file"
+
+    def __init__(self, path: str) -> None:
+        """Initialize the sink with the path to the output file."""
+        self.path = Path(path)
+
+    def send(self, events: list[dict[str, Any]]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("ab") as file:
+            file.write(self._encode(events))
+
+
+class UnixSocketSink(EventSink):
+    """Streams events to a listener on a local Unix domain socket.
+
+    The connection is opened on first use and re-opened after a failure.
+
+    Args:
+        path: Path of the Unix socket
+        timeout: Maximum time in seconds to connect or send
+    """
+
+    name = "unix"
+
+    def __init__(self, path: str, timeout: float = DEFAULT_REQUEST_TIMEOUT_SEC) -> None:
+        """Initialize the sink with the socket path."""
+        self.path = path
+        self.timeout = timeout
+        self._socket: Optional[socket.socket] = None
+
+    def send(self, events: list[dict[str, Any]]) -> None:
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(self.timeout)
+            try:
+                self._socket.connect(self.path)
+            except OSError:
+                self.close()
+                raise
+        try:
+            self._socket.sendall(self._encode(events))
+        except OSError:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class WebhookSink(EventSink):
+    """Posts event batches to an HTTP endpoint as newline-delimited JSON.
+
+    Args:
+        url: Endpoint URL
+        timeout: Maximum time in seconds to wait for the request to complete
+    """
+
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = DEFAULT_REQUEST_TIMEOUT_SEC) -> None:
+        """Initialize the sink with the endpoint URL."""
+        self.url = url
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def send(self, events: list[dict[str, Any]]) -> None:
+        response = self._session.post(self.url,
+                                      data=self._encode(events),
+                                      headers={"Content-Type": "application/x-ndjson"},
+                                      timeout=self.timeout)
+        if (HTTPStatus.BAD_REQUEST <= response.status_code < HTTPStatus.INTERNAL_SERVER_ERROR
+                and response.status_code not in RETRYABLE_CLIENT_ERRORS):
+            raise PermanentDeliveryError(f"{self.url} refused the batch with status {response.status_code}")
+        response.raise_for_status()
+
+    def close(self) -> None:
+        self._session.close()
+
+
+class _SinkWorker(threading.Thread):
+    """Background thread delivering queued events to a single sink."""
+
+    _STOP = object()
+
+    def __init__(self, sink: EventSink, buffer_size: int, batch_size: int, flush_interval: float,
+                 retry_initial: float, retry_max: float) -> None:
+        super().__init__(name=f"event-sink-{sink.name}", daemon=True)
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_initial = retry_initial
+        self.retry_max = retry_max
+        self.queue: queue.Queue = queue.Queue(maxsize=buffer_size)
+        self.dropped = 0
+        self._closing = threading.Event()
+
+    def offer(self, event: dict[str, Any]) -> None:
+        """Queue an event without blocking; it is dropped if the buffer is full."""
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logger.warning(f"Event buffer for {self.sink.name} sink is full, "
+                               f"{self.dropped} events dropped so far")
+
+    def stop(self, timeout: float) -> None:
+        """Deliver the remaining events and stop, waiting at most ``timeout`` seconds.
+
+        A sink that is still failing gets one last attempt; its pending batch
+        is dropped if that fails too.
+        """
+        self._closing.set()
+        try:
+            self.queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning(f"Event sink {self.sink.name} did not drain in time")
+        self.join(timeout=timeout)
+        if self.is_alive():
+            # Closing now would pull the sink from under a send still in progress
+            logger.warning(f"Event sink {self.sink.name} is still delivering, leaving it open")
+            return
+        self.sink.close()
+
+    def _fill(self, batch: list[dict[str, Any]]) -> bool:
+        """Add queued events to ``batch`` until it is full or the flush interval passes.
+
+        Returns:
+            bool: True if the worker should stop after delivering the batch
+        """
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                event = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return self._closing.is_set()
+            if event is self._STOP:
+                return True
+            batch.append(event)
+        return False
+
+    def run(self) -> None:
+        batch: list[dict[str, Any]] = []
+        stopping = False
+        delay = 0.0
+        while True:
+            if not batch and not stopping:
+                stopping = self._fill(batch)
+
+            if batch:
+                try:
+                    self.sink.send(batch)
+                except PermanentDeliveryError as e:
+                    self.dropped += len(batch)
+                    logger.error(f"Dropping {len(batch)} events rejected by {self.sink.name} sink: {e}")
+                except Exception as e:
+                    if self._closing.is_set():
+                        self.dropped += len(batch)
+                        logger.error(f"Dropping {len(batch)} events, {self.sink.name} sink failed at shutdown: {e}")
+                        return
+                    # Keep the batch; new events wait in the bounded queue meanwhile
+                    delay = min(max(delay * 2, self.retry_initial), self.retry_max)
+                    logger.warning(f"Failed to deliver {len(batch)} events to {self.sink.name} sink, "
+                                   f"retrying in {delay:.0f}s: {e}")
+                    self._closing.wait(delay)
+                    continue
+                # Delivered or permanently rejected
+                batch = []
+                delay = 0.0
+
+            if stopping:
+                return
+
+
+class EventPublisher:
+    """Fans play events out to sinks asynchronously.
+
+    Args:
+        sinks: Destinations for the events
+        buffer_size: Maximum number of undelivered events kept per sink
+        batch_size: Maximum number of events delivered in one call to a sink
+        flush_interval: Maximum time in seconds an event waits for its batch to fill
+        retry_initial: Delay in seconds before retrying a failed delivery, doubled per failure
+        retry_max: Maximum delay in seconds between delivery retries
+    """
+
+    def __init__(self, sinks: list[EventSink],
+                 buffer_size: int = EVENT_BUFFER_SIZE,
+                 batch_size: int = EVENT_BATCH_SIZE,
+                 flush_interval: float = EVENT_FLUSH_INTERVAL_SEC,
+                 retry_initial: float = EVENT_RETRY_INITIAL_SEC,
+                 retry_max: float = EVENT_RETRY_MAX_SEC) -> None:
+        """Start one delivery worker per sink."""
+        self._workers = [_SinkWorker(sink, buffer_size, batch_size, flush_interval, retry_initial, retry_max)
+                         for sink in sinks]
+        for worker in self._workers:
+            worker.start()
+
+    def publish(self, event: PlayEvent) -> None:
+        """Queue an event for every sink without blocking the caller.
+
+        Args:
+            event: The play event to publish
+        """
+        payload = asdict(event)
+        for worker in self._workers:
+            worker.offer(payload)
+
+    def close(self, timeout: float = DEFAULT_REQUEST_TIMEOUT_SEC) -> None:
+        """Flush pending events and stop the workers.
+
+        Args:
+            timeout: Maximum time in seconds to wait for each sink
+        """
+        for worker in self._workers:
+            worker.stop(timeout)
+
+
+def _similarity_index_sink(path: str) -> EventSink:
+    """Create a similarity index sink, importing NumPy only when one is configured."""
+    from similarity_index import SimilarityIndexSink
+
+    return SimilarityIndexSink(path)
+
+
+def create_sinks(spec: str) -> list[EventSink]:
+    """Create sinks from a comma-separated list of ``kind:target`` entries.
+
+    Supported kinds are ``file:<path>``, ``unix:<socket path>``,
+    ``webhook:<url>`` and ``index:<path>`` (a similarity index).
+
+    Args:
+        spec: Sink specification, e.g. ``file:../Data/plays.ndjson,webhook:http://127.0.0.1:8080/plays``
+
+    Returns:
+        list[EventSink]: The configured sinks
+
+    Raises:
+        ValueError: If an entry has an unknown kind or no target
+    """
+    sink_types = {"file": JsonLinesFileSink, "unix": UnixSocketSink, "webhook": WebhookSink,
+                  "index": _similarity_index_sink}
+    sinks = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        kind, _, target = entry.partition(":")
+        if kind not in sink_types or not target:
+            raise ValueError(f"Invalid event sink '{entry}', expected one of "
+                             f"{', '.join(f'{name}:<target>' for name in sink_types)}")
+        sinks.append(sink_types[kind](target))
+    return sinks
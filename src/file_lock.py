@@ -0,0 +1,69 @@
+"""
+Cross-process advisory file lock.
+
+Uses ``fcntl.flock`` on POSIX systems and ``msvcrt.locking`` on Windows.
+"""
+import os
+import time
+from pathlib import Path
+from typing import IO, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """Exclusive lock held on a lock file, shared by all processes using the same path.
+
+    Args:
+        path: Path to the lock file; it is created if it does not exist
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        """Initialize the lock without acquiring it."""
+        self.path = Path(path)
+        self._file: Optional[IO] = None
+
+    def acquire(self) -> None:
+        """Block until the lock is held by this process."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        file = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            else:
+                file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        time.sleep(0.01)
+        except Exception:
+            file.close()
+            raise
+        self._file = file
+
+    def release(self) -> None:
+        """Release the lock if it is held."""
+        if self._file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
@@ -0,0 +1,176 @@
+"""
+Bulk import of Spotify's downloadable streaming history into the song store.
+
+Supports the extended streaming history export (``Streaming_History_Audio_*.json``),
+whose entries carry a ``spotify_track_uri``. Files are read in parallel and
+streamed in chunks, plays shorter than the acceptance time are dropped, and
+the remaining plays are counted per track with a vectorized group-by before a
+single merge into the store.
+"""
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+import pandas as pd
+
+from definitions import SONGS_CSV_PATH, SONG_ACCEPTANCE_TIME_MS, SHARED_STORE
+from logger import logger
+from song_tracker import SongTracker
+
+READ_SIZE = 1 << 20         # Characters read from an export file at a time
+CHUNK_ROWS = 100_000        # Plays aggregated per group-by
+TRACK_URI_PREFIX = "spotify:track:"
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+def iter_json_array(path: Path, read_size: int = READ_SIZE) -> Iterator[dict[str, Any]]:
+    """Yield the objects of a top-level JSON array without loading the whole file.
+
+    Args:
+        path: Path to a file containing a JSON array of objects
+        read_size: Number of characters read at a time
+
+    Raises:
+        ValueError: If the file is not a JSON array or is truncated
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as file:
+        buffer = file.read(read_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} does not contain a JSON array")
+        pos = 1
+
+        while True:
+            pos = _SEPARATORS.match(buffer, pos).end()
+            if buffer.startswith("]", pos):
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The next object spans the end of the buffer: drop what was consumed and read more
+                chunk = file.read(read_size)
+                if not chunk:
+                    raise ValueError(f"Truncated JSON array in {path}")
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield item
+
+
+class StreamingHistoryImporter:
+    """Aggregates streaming history exports into play counts per track.
+
+    Args:
+        min_ms_played: Minimum playback time for an entry to count as a play
+        chunk_rows: Number of plays aggregated per group-by; bounds memory use
+        max_workers: Number of export files read in parallel processes
+    """
+
+    def __init__(self, min_ms_played: int = SONG_ACCEPTANCE_TIME_MS, chunk_rows: int = CHUNK_ROWS,
+                 max_workers: int = os.cpu_count() or 1) -> None:
+        """Initialize the importer with the play threshold, chunk size and parallelism."""
+        self.min_ms_played = min_ms_played
+        self.chunk_rows = chunk_rows
+        self.max_workers = max_workers
+
+    def _aggregate_chunk(self, rows: list[tuple]) -> pd.DataFrame:
+        """Filter a chunk of plays and count them per track."""
+        chunk = pd.DataFrame(rows, columns=["Song_ID", "Song", "Artist", "ms_played"])
+        chunk = chunk[(chunk["ms_played"] >= self.min_ms_played) & chunk["Song_ID"].notna()]
+        return (chunk.groupby("Song_ID", sort=False)
+                .agg(Song=("Song", "first"), Artist=("Artist", "first"), Count=("ms_played", "size")))
+
+    @staticmethod
+    def _combine(partials: list[pd.DataFrame]) -> pd.DataFrame:
+        """Merge partial per-track counts into one count per track."""
+        return (pd.concat(partials)
+                .groupby(level="Song_ID", sort=False)
+                .agg(Song=("Song", "first"), Artist=("Artist", "first"), Count=("Count", "sum")))
+
+    def _aggregate_file(self, path: Path) -> pd.DataFrame:
+        """Stream one export file in chunks of at most ``chunk_rows`` plays and count them per track."""
+        logger.info(f"Reading streaming history {path}")
+        partials = []
+        rows = []
+        for entry in iter_json_array(path):
+            uri = entry.get("spotify_track_uri")
+            rows.append((uri[len(TRACK_URI_PREFIX):] if uri and uri.startswith(TRACK_URI_PREFIX) else None,
+                         entry.get("master_metadata_track_name"),
+                         entry.get("master_metadata_album_artist_name"),
+                         entry.get("ms_played", 0)))
+            if len(rows) >= self.chunk_rows:
+                partials.append(self._aggregate_chunk(rows))
+                rows = []
+        partials.append(self._aggregate_chunk(rows))
+        return self._combine(partials)
+
+    def aggregate(self, paths: Iterable[Path]) -> pd.DataFrame:
+        """Count qualifying plays per track across export files.
+
+        Files are aggregated in parallel worker processes; only their
+        per-track counts are sent back and combined.
+
+        Args:
+            paths: Export files to read
+
+        Returns:
+            pd.DataFrame: Play counts indexed by Song_ID with 'Song', 'Artists' and 'Count' columns
+        """
+        paths = list(paths)
+        if not paths:
+            return pd.DataFrame(columns=["Song", "Artists", "Count"]).rename_axis("Song_ID")
+
+        if self.max_workers > 1 and len(paths) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(paths))) as executor:
+                partials = list(executor.map(self._aggregate_file, paths))
+        else:
+            partials = [self._aggregate_file(path) for path in paths]
+
+        counts = self._combine(partials)
+        counts["Artists"] = [[artist] if isinstance(artist, str) else [] for artist in counts.pop("Artist")]
+        return counts[["Song", "Artists", "Count"]]
+
+    def import_into(self, song_tracker: SongTracker, paths: Iterable[Path]) -> pd.DataFrame:
+        """Aggregate export files and merge the counts into the store in one write.
+
+        Importing the same export twice counts its plays twice.
+
+        Args:
+            song_tracker: Store to merge the counts into
+            paths: Export files to read
+
+        Returns:
+            pd.DataFrame: The merged play counts
+        """
+        start = time.perf_counter()
+        counts = self.aggregate(paths)
+        song_tracker.merge_counts(counts)
+        logger.info(f"Imported {int(counts['Count'].sum())} plays of {len(counts)} tracks "
+                    f"in {time.perf_counter() - start:.2f}s")
+        return counts
+
+
+def find_export_files(paths: Iterable[str]) -> list[Path]:
+    """Expand directories into the audio streaming history files they contain."""
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob("Streaming_History_Audio_*.json")) if path.is_dir() else [path])
+    return files
+
+
+def main() -> None:
+    """Import streaming history files or export directories given on the command line."""
+    if len(sys.argv) < 2:
+        print(f"Usage: python {Path(__file__).name} <export file or directory>...")
+        sys.exit(2)
+
+    StreamingHistoryImporter().import_into(SongTracker(SONGS_CSV_PATH, shared=SHARED_STORE),
+                                           find_export_files(sys.argv[1:]))
+
+
+if __name__ == "__main__":
+    main()
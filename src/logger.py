@@ -28,8 +28,6 @@ logger.setLevel(logging.INFO)
 logger.addHandler(console)
 logger.propagate = False  # Prevents duplicate logs if other loggers are configured
 
-logger.info("LOGS START")
-
 def function_logging(func):
     def wrapper(*args, **kwargs):
         logger.info("START "+ func.__name__)
@@ -4,10 +4,15 @@ Spotify Song Tracker
 This script tracks the currently playing songs on Spotify and maintains a count of plays
 in a CSV file. It handles song changes, repeats, and various error conditions.
 """
+import argparse
+import os
+import threading
 import time
 import signal
 import sys
-from typing import Optional
+from concurrent.futures import Future
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
 from definitions import (
     SONGS_CSV_PATH,
@@ -17,28 +22,105 @@ from definitions import (
     REDIRECT_URI,
     LOOP_DELAY_SECONDS,
     MAX_RETRIES,
-    RETRY_DELAY_SECONDS
+    RETRY_DELAY_SECONDS,
+    SHARED_STORE,
+    EVENT_SINKS,
+    PROFILE_WINDOW_SEC
 )
-from models import AuthSpotify
+from diagnostics import Profiler, phase_timer
+from event_sinks import EventPublisher, create_sinks
+from models import AuthSpotify, PlayEvent
 from spotify import Spotify
-from song_tracker import SongTracker
 from logger import logger
 
+if TYPE_CHECKING:
+    from song_tracker import SongTracker
+
 class SpotifyTracker:
     """Main class for tracking Spotify playback."""
     
-    def __init__(self):
-        """Initialize the Spotify tracker with configuration."""
+    def __init__(self, profile_window: Optional[float] = None):
+        """Initialize the Spotify tracker with configuration.
+
+        Args:
+            profile_window: If set, profile the tracking loop for this many seconds after startup
+        """
         self.running = True
-        self.song_tracker = SongTracker(SONGS_CSV_PATH)
+        self.store_error: Optional[Exception] = None
+        self._store_future: Optional[Future] = None
+        self._check_store_access()
         self.spotify = self._setup_spotify()
+        self.event_publisher = EventPublisher(create_sinks(EVENT_SINKS)) if EVENT_SINKS else None
         self.current_song_id: Optional[str] = None
         self.save_status = False
+        self.profiler = Profiler(memory_report=self._memory_report)
+        self.profile_window = profile_window
         
         # Set up signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self._handle_shutdown)
         signal.signal(signal.SIGTERM, self._handle_shutdown)
+        # SIGUSR1 requests a profiling session of the running loop (not available on Windows)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, self._handle_profile_request)
     
+    @property
+    def song_tracker(self) -> "SongTracker":
+        """Song store, waiting for the background load started by ``run`` to finish.
+
+        Raises:
+            Exception: If the store could not be loaded
+        """
+        self._start_loading_store()
+        return self._store_future.result()
+
+    def _start_loading_store(self) -> None:
+        """Load the song store in a background thread.
+
+        This keeps pandas out of startup, and recovering a large store from
+        an older snapshot does not delay polling. A failed load stops the loop,
+        since no play could be recorded.
+        """
+        if self._store_future is not None:
+            return
+        self._store_future = Future()
+
+        def load():
+            try:
+                from song_tracker import SongTracker
+
+                self._store_future.set_result(SongTracker(SONGS_CSV_PATH, shared=SHARED_STORE))
+            except Exception as e:
+                self._handle_store_failure(e)
+                self._store_future.set_exception(e)
+
+        threading.Thread(target=load, name="song-store-loader", daemon=True).start()
+
+    @staticmethod
+    def _check_store_access() -> None:
+        """Check that the song store can be read and written, without loading it.
+
+        Raises:
+            PermissionError: If the store file or its directory is not accessible
+        """
+        path = Path(SONGS_CSV_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if not os.access(path.parent, os.R_OK | os.W_OK | os.X_OK):
+            raise PermissionError(f"Song store directory {path.parent} is not readable and writable")
+        if path.exists() and not os.access(path, os.R_OK | os.W_OK):
+            raise PermissionError(f"Song store {path} is not readable and writable")
+
+    def _handle_store_failure(self, error: Exception) -> None:
+        """Stop the loop after the song store failed to load; ``run`` then raises.
+
+        Errors saving a single play are not fatal; they are logged by
+        ``_process_current_song`` and polling continues.
+        """
+        if self.store_error is not None:
+            return
+        logger.critical(f"Song store {SONGS_CSV_PATH} failed, stopping: {error}")
+        self.store_error = error
+        self.running = False
+
     @staticmethod
     def _setup_spotify() -> Spotify:
         """Set up and authenticate with the Spotify API."""
@@ -60,6 +142,26 @@ class SpotifyTracker:
         """
         logger.info("Shutting down gracefully...")
         self.running = False
+
+    def _handle_profile_request(self, signum, frame):
+        """Request a profiling session; it is started by the loop on its next iteration.
+
+        Args:
+            signum: The signal number
+            frame: The current stack frame
+        """
+        self.profile_window = self.profile_window or PROFILE_WINDOW_SEC
+
+    def _memory_report(self):
+        """Describe the memory held by the song store for the profiler's memory report."""
+        # Never wait for or trigger loading the store just to report on it
+        if self._store_future is None or not self._store_future.done() or self._store_future.exception():
+            return ["Song store: not loaded"]
+        song_tracker = self._store_future.result()
+        usage = song_tracker.df.memory_usage(deep=True)
+        lines = [f"Song store: {len(song_tracker.df)} rows, {usage.sum() / 1024 / 1024:.2f} MiB"]
+        lines += [f"  {column}: {size / 1024 / 1024:.2f} MiB" for column, size in usage.items()]
+        return lines
     
     def _process_current_song(self):
         """Process the currently playing song."""
@@ -68,6 +170,11 @@ class SpotifyTracker:
             
             if not current_song or not current_song.play_status:
                 return True
+
+            # Local files have no Spotify ID and cannot be tracked
+            if not current_song.song_id:
+                logger.debug(f"Skipping item without a Spotify ID: {current_song.song_name}")
+                return True
                 
             # Handle new song
             if current_song.progress_ms >= SONG_ACCEPTANCE_TIME_MS and not self.save_status:
@@ -102,12 +209,26 @@ class SpotifyTracker:
         )
         self.current_song_id = current_song.song_id
         self.save_status = True
+        self._publish_play("new_play", current_song)
     
     def _handle_repeated_song(self, current_song):
         """Handle when the current song is repeated."""
         logger.info(f"Song repeated: {current_song.song_name}")
         self.song_tracker.update_song_counter(current_song.song_id)
         self.save_status = False
+        self._publish_play("repeated_play", current_song)
+
+    def _publish_play(self, event, current_song):
+        """Publish a recorded play to the configured event sinks without blocking."""
+        if self.event_publisher is None:
+            return
+        self.event_publisher.publish(PlayEvent(
+            event=event,
+            song_id=current_song.song_id,
+            song_name=current_song.song_name,
+            artists=current_song.artists,
+            played_at=time.time()
+        ))
     
     def _handle_next_song(self):
         """Handle transition to a new song."""
@@ -117,12 +238,19 @@ class SpotifyTracker:
     def run(self):
         """Run the main tracking loop."""
         logger.info("Starting Spotify Song Tracker...")
+        self._start_loading_store()
         
         consecutive_errors = 0
         
         while self.running:
             try:
-                if self._process_current_song():
+                if self.profile_window:
+                    self.profiler.start(self.profile_window)
+                    self.profile_window = None
+
+                with phase_timer.phase("state"):
+                    processed = self._process_current_song()
+                if processed:
                     consecutive_errors = 0
                 else:
                     # Only increment error counter if we're not in the middle of processing a song
@@ -150,12 +278,24 @@ class SpotifyTracker:
                     logger.error("Maximum retry attempts reached. Shutting down.")
                     break
         
+        self.profiler.stop()
+        if self.event_publisher is not None:
+            self.event_publisher.close()
         logger.info("Spotify Song Tracker stopped")
+        if self.store_error is not None:
+            raise RuntimeError(f"Song store {SONGS_CSV_PATH} is unusable: {self.store_error}") from self.store_error
 
 def main():
     """Entry point for the application."""
+    parser = argparse.ArgumentParser(description="Track songs played on Spotify.")
+    parser.add_argument("--profile", type=float, metavar="SECONDS",
+                        help="profile the tracking loop for SECONDS after startup "
+                             f"(also triggered at runtime with SIGUSR1 for {PROFILE_WINDOW_SEC} seconds)")
+    args = parser.parse_args()
+
+    logger.info("LOGS START")
     try:
-        tracker = SpotifyTracker()
+        tracker = SpotifyTracker(profile_window=args.profile)
         tracker.run()
     except Exception as e:
         logger.critical(f"Fatal error: {e}", exc_info=True)
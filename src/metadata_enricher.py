@@ -0,0 +1,321 @@
+"""
+Bulk metadata enrichment for the tracked song library.
+
+This module resolves track and artist metadata (durations, popularity, genres,
+album data) through Spotify's batch endpoints and keeps the results in a
+persistent, append-only cache so interrupted runs resume where they stopped.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+import pandas as pd
+from requests import HTTPError
+
+from definitions import (
+    CLI_ID,
+    SECRET_ID,
+    REDIRECT_URI,
+    SONGS_CSV_PATH,
+    METADATA_CACHE_PATH,
+    METADATA_TTL_SEC,
+    ENRICH_MAX_WORKERS,
+    SEVERAL_ITEMS_LIMIT,
+    MAX_RETRIES,
+    RETRY_DELAY_SECONDS
+)
+from logger import logger
+from models import AuthSpotify
+from song_tracker import SongTracker
+from spotify_api import SpotifyAPI
+
+TRACK = "track"
+ARTIST = "artist"
+
+
+class MetadataCache:
+    """Persistent metadata cache keyed by item kind and Spotify ID.
+
+    Entries are appended to a JSON lines file as soon as they are fetched, so
+    a crash loses at most the batch in flight. When the file is loaded the
+    last entry for each key wins; ``compact`` rewrites it without duplicates.
+
+    Args:
+        path: Path to the JSON lines cache file
+        ttl_sec: Age in seconds after which an entry is considered stale
+    """
+
+    def __init__(self, path: str = METADATA_CACHE_PATH, ttl_sec: int = METADATA_TTL_SEC) -> None:
+        """Initialize the cache and load any existing entries from disk."""
+        self.path = Path(path)
+        self.ttl_sec = ttl_sec
+        self._entries: dict[tuple[str, str], dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        """Replay the cache file, skipping lines truncated by an interrupted write."""
+        if not self.path.exists():
+            return
+
+        skipped = 0
+        with self.path.open(encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                    self._entries[(entry["kind"], entry["id"])] = entry
+                except (ValueError, KeyError):
+                    skipped += 1
+
+        if skipped:
+            logger.warning(f"Skipped {skipped} unreadable entries in metadata cache {self.path}")
+        logger.info(f"Loaded metadata cache with {len(self._entries)} entries")
+
+    def get(self, kind: str, item_id: str) -> Optional[dict[str, Any]]:
+        """Return the cached metadata for an item, or None if it is unknown.
+
+        Args:
+            kind: Item kind (``track`` or ``artist``)
+            item_id: Spotify ID of the item
+        """
+        entry = self._entries.get((kind, item_id))
+        return entry["data"] if entry else None
+
+    def stale_ids(self, kind: str, item_ids: Iterable[str]) -> list[str]:
+        """Return the IDs that are missing from the cache or older than the TTL.
+
+        Args:
+            kind: Item kind (``track`` or ``artist``)
+            item_ids: Spotify IDs to check
+
+        Returns:
+            list[str]: Unique IDs that need to be fetched, in input order
+        """
+        now = time.time()
+        stale = []
+        for item_id in dict.fromkeys(item_ids):
+            entry = self._entries.get((kind, item_id))
+            if entry is None or now - entry["fetched_at"] > self.ttl_sec:
+                stale.append(item_id)
+        return stale
+
+    def put_many(self, kind: str, items: dict[str, Optional[dict[str, Any]]]) -> None:
+        """Store fetched metadata and append it to the cache file.
+
+        Items with ``None`` data are remembered as not found so they are not
+        requested again until the TTL expires.
+
+        Args:
+            kind: Item kind (``track`` or ``artist``)
+            items: Mapping of Spotify ID to metadata
+        """
+        fetched_at = time.time()
+        entries = [{"kind": kind, "id": item_id, "fetched_at": fetched_at, "data": data}
+                   for item_id, data in items.items()]
+
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as file:
+                file.writelines(json.dumps(entry) + "\n" for entry in entries)
+                file.flush()
+                os.fsync(file.fileno())
+            for entry in entries:
+                self._entries[(kind, entry["id"])] = entry
+
+    def compact(self) -> None:
+        """Rewrite the cache file with a single entry per key."""
+        with self._lock:
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open("w", encoding="utf-8") as file:
+                file.writelines(json.dumps(entry) + "\n" for entry in self._entries.values())
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+        logger.info(f"Compacted metadata cache to {len(self._entries)} entries")
+
+
+class MetadataEnricher:
+    """Resolves track and artist metadata for a song library in parallel batches.
+
+    Args:
+        spotify_api: Authenticated API client; client credentials are sufficient
+        cache: Metadata cache used to skip fresh items and persist results
+        max_workers: Number of batch requests in flight at once
+    """
+
+    def __init__(self, spotify_api: SpotifyAPI, cache: MetadataCache,
+                 max_workers: int = ENRICH_MAX_WORKERS) -> None:
+        """Initialize the enricher with an API client and a cache."""
+        self.spotify_api = spotify_api
+        self.cache = cache
+        self.max_workers = max_workers
+
+    @staticmethod
+    def _parse_track(track: dict[str, Any]) -> dict[str, Any]:
+        """Extract the stored fields from a Spotify track object."""
+        album = track.get("album") or {}
+        return {
+            "name": track.get("name"),
+            "duration_ms": track.get("duration_ms"),
+            "popularity": track.get("popularity"),
+            "explicit": track.get("explicit"),
+            "artist_ids": [artist["id"] for artist in track.get("artists", []) if artist.get("id")],
+            "album_id": album.get("id"),
+            "album_name": album.get("name"),
+            "album_type": album.get("album_type"),
+            "release_date": album.get("release_date"),
+        }
+
+    @staticmethod
+    def _parse_artist(artist: dict[str, Any]) -> dict[str, Any]:
+        """Extract the stored fields from a Spotify artist object."""
+        return {
+            "name": artist.get("name"),
+            "genres": artist.get("genres", []),
+            "popularity": artist.get("popularity"),
+            "followers": (artist.get("followers") or {}).get("total"),
+        }
+
+    @staticmethod
+    def _fetch_with_retry(fetch: Callable[[list[str]], list], batch: list[str]) -> list:
+        """Call a batch endpoint, waiting out rate limits as advised by Spotify."""
+        for attempt in range(MAX_RETRIES):
+            try:
+                return fetch(batch)
+            except HTTPError as e:
+                response = e.response
+                if (response is None or response.status_code != HTTPStatus.TOO_MANY_REQUESTS
+                        or attempt == MAX_RETRIES - 1):
+                    raise
+                delay = int(response.headers.get("Retry-After", RETRY_DELAY_SECONDS))
+                logger.warning(f"Rate limited, retrying batch in {delay} seconds...")
+                time.sleep(delay)
+        return []
+
+    def _enrich(self, kind: str, item_ids: Iterable[str],
+                fetch: Callable[[list[str]], list],
+                parse: Callable[[dict[str, Any]], dict[str, Any]]) -> int:
+        """Fetch stale items of one kind in parallel batches and cache the results.
+
+        Returns:
+            int: Number of items fetched
+        """
+        stale = self.cache.stale_ids(kind, item_ids)
+        if not stale:
+            logger.info(f"All {kind} metadata is up to date")
+            return 0
+
+        batches = [stale[i:i + SEVERAL_ITEMS_LIMIT] for i in range(0, len(stale), SEVERAL_ITEMS_LIMIT)]
+        logger.info(f"Fetching metadata for {len(stale)} {kind}s in {len(batches)} batches")
+
+        fetched = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._fetch_with_retry, fetch, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    items = future.result()
+                except Exception as e:
+                    # Leave the batch uncached so the next run picks it up again
+                    logger.error(f"Failed to fetch {kind} batch starting at {batch[0]}: {e}")
+                    continue
+
+                self.cache.put_many(kind, {item_id: parse(item) if item else None
+                                           for item_id, item in zip(batch, items)})
+                fetched += len(batch)
+                logger.debug(f"Fetched {fetched}/{len(stale)} {kind}s")
+
+        logger.info(f"Fetched metadata for {fetched} {kind}s")
+        return fetched
+
+    def enrich_tracks(self, track_ids: Iterable[str]) -> int:
+        """Fetch and cache metadata for the given tracks.
+
+        Args:
+            track_ids: Spotify track IDs
+
+        Returns:
+            int: Number of tracks fetched from the API
+        """
+        return self._enrich(TRACK, track_ids, self.spotify_api.get_several_tracks, self._parse_track)
+
+    def enrich_artists(self, artist_ids: Iterable[str]) -> int:
+        """Fetch and cache metadata for the given artists.
+
+        Args:
+            artist_ids: Spotify artist IDs
+
+        Returns:
+            int: Number of artists fetched from the API
+        """
+        return self._enrich(ARTIST, artist_ids, self.spotify_api.get_several_artists, self._parse_artist)
+
+    def enrich_library(self, song_tracker: SongTracker) -> pd.DataFrame:
+        """Enrich every tracked song and its artists, then join the metadata with play counts.
+
+        Args:
+            song_tracker: Tracker holding the song library
+
+        Returns:
+            pd.DataFrame: Tracked songs indexed by Song_ID with metadata columns added
+        """
+        track_ids = [str(song_id) for song_id in song_tracker.df.index]
+        self.enrich_tracks(track_ids)
+
+        artist_ids = [artist_id
+                      for track_id in track_ids
+                      for artist_id in (self.cache.get(TRACK, track_id) or {}).get("artist_ids", [])]
+        self.enrich_artists(artist_ids)
+
+        return self.build_metadata_frame(song_tracker)
+
+    def build_metadata_frame(self, song_tracker: SongTracker) -> pd.DataFrame:
+        """Join cached metadata with the tracked songs without calling the API.
+
+        Args:
+            song_tracker: Tracker holding the song library
+
+        Returns:
+            pd.DataFrame: Tracked songs indexed by Song_ID with metadata columns added
+        """
+        rows = {}
+        for song_id in song_tracker.df.index:
+            track = self.cache.get(TRACK, str(song_id))
+            if not track:
+                continue
+            artists = [self.cache.get(ARTIST, artist_id) or {} for artist_id in track["artist_ids"]]
+            rows[song_id] = {
+                "Duration_ms": track["duration_ms"],
+                "Popularity": track["popularity"],
+                "Explicit": track["explicit"],
+                "Album": track["album_name"],
+                "Album_ID": track["album_id"],
+                "Release_Date": track["release_date"],
+                "Artist_IDs": track["artist_ids"],
+                "Genres": sorted({genre for artist in artists for genre in artist.get("genres", [])}),
+            }
+
+        metadata = pd.DataFrame.from_dict(rows, orient="index")
+        return song_tracker.df.join(metadata, how="left")
+
+
+def main() -> None:
+    """Enrich the tracked song library using client credentials."""
+    spotify_api = SpotifyAPI(AuthSpotify(cli_id=CLI_ID,
+                                         secret_id=SECRET_ID,
+                                         redirect_uri=REDIRECT_URI,
+                                         scope=[]))
+    cache = MetadataCache()
+    enricher = MetadataEnricher(spotify_api, cache)
+    enricher.enrich_library(SongTracker(SONGS_CSV_PATH))
+    cache.compact()
+
+
+if __name__ == "__main__":
+    main()
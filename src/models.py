@@ -1,3 +1,4 @@
+from concurrent.futures import Future
 from dataclasses import dataclass
 
 @dataclass
@@ -22,3 +23,19 @@ class SpotifyTokens:
     """Data class to hold Spotify API tokens."""
     access_token: str
     refresh_token: str
+
+@dataclass
+class AuthorizationRequest:
+    """Data class for a pending OAuth2 authorization flow."""
+    auth_url: str
+    state: str
+    code: Future
+
+@dataclass
+class PlayEvent:
+    """Data class for a play detected by the tracker."""
+    event: str
+    song_id: str
+    song_name: str
+    artists: list[str]
+    played_at: float
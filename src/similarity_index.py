@@ -0,0 +1,549 @@
+"""
+Local similarity index over listening history.
+
+Tracks played close together in a listening session are linked in a sparse
+co-listening graph, and so are their artists. Nearest-neighbour queries
+normalize those links by play counts with NumPy, and an optional hashed
+genre/artist embedding built from enriched metadata adds content similarity
+for tracks with few co-plays. The index is updated one play at a time and
+can be bootstrapped from streaming history exports. A new index file starts
+from the play counts in the song store.
+
+Writers never overwrite each other's updates: each one merges the plays it
+observed since its last save into the file while holding a file lock.
+"""
+import ast
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime
+from itertools import chain
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterable, Optional
+
+import numpy as np
+
+from definitions import (
+    SIMILARITY_INDEX_PATH,
+    CO_LISTEN_WINDOW,
+    SESSION_GAP_SEC,
+    FEATURE_DIM,
+    INDEX_SAVE_INTERVAL_SEC,
+    SONG_ACCEPTANCE_TIME_MS,
+    SONGS_CSV_PATH,
+    SHARED_STORE
+)
+from event_sinks import EventSink
+from file_lock import FileLock
+from logger import logger
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class SimilarityIndex:
+    """Sparse co-listening graph of tracks and artists with vectorized neighbour queries.
+
+    Args:
+        window: Number of preceding plays in a session linked to each new play
+        session_gap_sec: Pause in seconds after which a new listening session starts
+    """
+
+    def __init__(self, window: int = CO_LISTEN_WINDOW, session_gap_sec: int = SESSION_GAP_SEC) -> None:
+        """Initialize an empty index."""
+        self.window = window
+        self.session_gap_sec = session_gap_sec
+        self.track_ids: list[str] = []
+        self.artists: list[str] = []
+        self._track_index: dict[str, int] = {}
+        self._artist_index: dict[str, int] = {}
+        self._track_artists: list[list[int]] = []
+        self._track_links: list[dict[int, float]] = []
+        self._artist_links: list[dict[int, float]] = []
+        self._track_plays = np.zeros(0)
+        self._artist_plays = np.zeros(0)
+        self._features: Optional[np.ndarray] = None
+        self._recent: deque[tuple[int, float]] = deque(maxlen=window)
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _grow(values: np.ndarray, size: int) -> np.ndarray:
+        """Return ``values`` with room for at least ``size`` entries, doubling capacity."""
+        if size <= len(values):
+            return values
+        grown = np.zeros(max(size, 2 * len(values), 1024))
+        grown[:len(values)] = values
+        return grown
+
+    def _artist(self, name: str) -> int:
+        """Return the index of an artist, adding it if unknown."""
+        index = self._artist_index.get(name)
+        if index is None:
+            index = self._artist_index[name] = len(self.artists)
+            self.artists.append(name)
+            self._artist_links.append({})
+            self._artist_plays = self._grow(self._artist_plays, len(self.artists))
+        return index
+
+    def _track(self, song_id: str, artists: Iterable[str]) -> int:
+        """Return the index of a track, adding it if unknown."""
+        index = self._track_index.get(song_id)
+        if index is None:
+            index = self._track_index[song_id] = len(self.track_ids)
+            self.track_ids.append(song_id)
+            self._track_artists.append([self._artist(name) for name in artists])
+            self._track_links.append({})
+            self._track_plays = self._grow(self._track_plays, len(self.track_ids))
+        return index
+
+    @staticmethod
+    def _link(links: list[dict[int, float]], i: int, j: int, weight: float) -> None:
+        """Add a symmetric link weight between two nodes."""
+        links[i][j] = links[i].get(j, 0.0) + weight
+        links[j][i] = links[j].get(i, 0.0) + weight
+
+    def observe_play(self, song_id: str, artists: Iterable[str], played_at: float) -> None:
+        """Record a play and link it to the preceding plays of the same session.
+
+        Closer plays get a higher weight (1 / distance in plays).
+
+        Args:
+            song_id: Spotify ID of the played track
+            artists: Artist names of the track
+            played_at: Unix time of the play
+        """
+        with self._lock:
+            i = self._track(song_id, artists)
+            self._track_plays[i] += 1
+            self._artist_plays[self._track_artists[i]] += 1
+
+            if self._recent and played_at - self._recent[-1][1] > self.session_gap_sec:
+                self._recent.clear()
+            for distance, (j, _) in enumerate(reversed(self._recent), start=1):
+                if j == i:
+                    continue
+                weight = 1.0 / distance
+                self._link(self._track_links, i, j, weight)
+                for a in self._track_artists[i]:
+                    for b in self._track_artists[j]:
+                        if a != b:
+                            self._link(self._artist_links, a, b, weight)
+            self._recent.append((i, played_at))
+
+    def observe_history(self, paths: Iterable[Path], min_ms_played: int = SONG_ACCEPTANCE_TIME_MS) -> int:
+        """Replay extended streaming history exports into the index.
+
+        Files are expected in chronological order, as Spotify names them.
+
+        Args:
+            paths: Export files to read
+            min_ms_played: Minimum playback time for an entry to count as a play
+
+        Returns:
+            int: Number of plays observed
+        """
+        from history_importer import TRACK_URI_PREFIX, iter_json_array
+
+        observed = 0
+        for path in paths:
+            for entry in iter_json_array(path):
+                uri = entry.get("spotify_track_uri")
+                if not uri or not uri.startswith(TRACK_URI_PREFIX) or entry.get("ms_played", 0) < min_ms_played:
+                    continue
+                artist = entry.get("master_metadata_album_artist_name")
+                played_at = datetime.fromisoformat(entry["ts"].replace("Z", "+00:00")).timestamp()
+                self.observe_play(uri[len(TRACK_URI_PREFIX):], [artist] if artist else [], played_at)
+                observed += 1
+        logger.info(f"Observed {observed} plays from streaming history")
+        return observed
+
+    def observe_counts(self, songs: "pd.DataFrame") -> int:
+        """Add play counts from the song store, without co-listening links.
+
+        The store keeps no play times, so its counts only seed play counts
+        (which pick the default recommendation seeds) and track artists.
+
+        Args:
+            songs: SongTracker DataFrame indexed by song ID with 'Artists' and 'Count' columns
+
+        Returns:
+            int: Number of plays added
+        """
+        added = 0
+        with self._lock:
+            for song_id, artists, count in zip(songs.index, songs['Artists'], songs['Count']):
+                if isinstance(artists, str):
+                    # The CSV stores artist lists in their repr form
+                    artists = ast.literal_eval(artists) if artists.startswith('[') else [artists]
+                i = self._track(str(song_id), artists)
+                self._track_plays[i] += count
+                self._artist_plays[self._track_artists[i]] += count
+                added += int(count)
+        logger.info(f"Seeded {added} plays of {len(songs)} tracks from the song store")
+        return added
+
+    def merge(self, other: "SimilarityIndex", counts: bool = True) -> None:
+        """Add the play counts and links of another index to this one.
+
+        Args:
+            other: Index whose observations are added
+            counts: Whether to add play counts, or only tracks and links
+        """
+        with self._lock, other._lock:
+            artist_map = [self._artist(name) for name in other.artists]
+            track_map = [self._track(song_id, [other.artists[a] for a in other._track_artists[i]])
+                         for i, song_id in enumerate(other.track_ids)]
+            if counts:
+                self._track_plays[track_map] += other._track_plays[:len(track_map)]
+                self._artist_plays[artist_map] += other._artist_plays[:len(artist_map)]
+            for links, other_links, mapping in ((self._track_links, other._track_links, track_map),
+                                                (self._artist_links, other._artist_links, artist_map)):
+                for i, row in enumerate(other_links):
+                    target = links[mapping[i]]
+                    for j, weight in row.items():
+                        target[mapping[j]] = target.get(mapping[j], 0.0) + weight
+            self._features = None
+
+    def reset_counts(self) -> None:
+        """Clear play counts and links but keep known tracks and the current session.
+
+        Used after merging this index into a file, so it collects only new
+        observations while plays keep linking to the ongoing session.
+        """
+        with self._lock:
+            self._track_plays[:] = 0
+            self._artist_plays[:] = 0
+            self._track_links = [{} for _ in self.track_ids]
+            self._artist_links = [{} for _ in self.artists]
+            self._features = None
+
+    @staticmethod
+    def _top_k(candidates: np.ndarray, scores: np.ndarray, k: int) -> list[tuple[int, float]]:
+        """Return the ``k`` best scoring candidates, best first."""
+        if len(candidates) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[best], scores[best]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(candidates[n]), float(scores[n])) for n in order]
+
+    @staticmethod
+    def _normalized_row(links: list[dict[int, float]], plays: np.ndarray, i: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return neighbour indices and link weights scaled by 1 / sqrt(plays_i * plays_j)."""
+        row = links[i]
+        neighbours = np.fromiter(row.keys(), dtype=np.int64, count=len(row))
+        weights = np.fromiter(row.values(), dtype=np.float64, count=len(row))
+        return neighbours, weights / np.sqrt(np.maximum(plays[i] * plays[neighbours], 1.0))
+
+    def similar_tracks(self, song_id: str, k: int = 10) -> list[tuple[str, float]]:
+        """Return the tracks most often played together with ``song_id``.
+
+        Args:
+            song_id: Spotify ID of the seed track
+            k: Maximum number of tracks to return
+
+        Returns:
+            list[tuple[str, float]]: Track IDs with their similarity, most similar first
+
+        Raises:
+            ValueError: If the track is not in the index
+        """
+        with self._lock:
+            i = self._track_index.get(song_id)
+            if i is None:
+                raise ValueError(f"No plays recorded for track: {song_id}")
+            neighbours, scores = self._normalized_row(self._track_links, self._track_plays, i)
+            return [(self.track_ids[j], score) for j, score in self._top_k(neighbours, scores, k)]
+
+    def similar_artists(self, artist_name: str, k: int = 10) -> list[tuple[str, float]]:
+        """Return the artists most often played in the same sessions as ``artist_name``.
+
+        Args:
+            artist_name: Name of the seed artist
+            k: Maximum number of artists to return
+
+        Returns:
+            list[tuple[str, float]]: Artist names with their similarity, most similar first
+
+        Raises:
+            ValueError: If the artist is not in the index
+        """
+        with self._lock:
+            a = self._artist_index.get(artist_name)
+            if a is None:
+                raise ValueError(f"No plays recorded for artist: {artist_name}")
+            neighbours, scores = self._normalized_row(self._artist_links, self._artist_plays, a)
+            return [(self.artists[b], score) for b, score in self._top_k(neighbours, scores, k)]
+
+    def build_content_features(self, metadata_cache, dim: int = FEATURE_DIM) -> None:
+        """Embed tracks by their artists and genres using enriched metadata.
+
+        Genres and artist IDs are hashed into ``dim`` buckets and each row is
+        L2-normalized, so a dot product is the cosine similarity. Tracks
+        without cached metadata get a zero row.
+
+        Args:
+            metadata_cache: MetadataCache filled by the metadata enricher
+            dim: Embedding size
+        """
+        from metadata_enricher import ARTIST, TRACK
+
+        with self._lock:
+            features = np.zeros((len(self.track_ids), dim), dtype=np.float32)
+            for i, song_id in enumerate(self.track_ids):
+                track = metadata_cache.get(TRACK, song_id)
+                if not track:
+                    continue
+                for artist_id in track["artist_ids"]:
+                    features[i, zlib.crc32(f"artist:{artist_id}".encode()) % dim] += 1.0
+                    for genre in (metadata_cache.get(ARTIST, artist_id) or {}).get("genres", []):
+                        features[i, zlib.crc32(f"genre:{genre}".encode()) % dim] += 1.0
+            norms = np.linalg.norm(features, axis=1, keepdims=True)
+            self._features = features / np.where(norms > 0, norms, 1.0)
+        logger.info(f"Built content features for {len(self.track_ids)} tracks")
+
+    def recommend(self, k: int = 10, seeds: Optional[list[str]] = None, seed_count: int = 20,
+                  content_weight: float = 0.5) -> list[tuple[str, float]]:
+        """Recommend tracks similar to what is played most.
+
+        Co-listening neighbours of the seed tracks are summed, weighted by
+        seed play counts. If content features are built, the cosine
+        similarity to the seeds' mean embedding is added with ``content_weight``.
+
+        Args:
+            k: Maximum number of tracks to return
+            seeds: Seed track IDs (default: the ``seed_count`` most played tracks)
+            seed_count: Number of most played tracks used when ``seeds`` is not given
+            content_weight: Weight of content similarity relative to co-listening
+
+        Returns:
+            list[tuple[str, float]]: Recommended track IDs with their scores, best first
+        """
+        with self._lock:
+            n = len(self.track_ids)
+            if n == 0:
+                return []
+            plays = self._track_plays[:n]
+            if seeds is None:
+                seed_idx = np.argpartition(-plays, min(seed_count, n) - 1)[:seed_count]
+            else:
+                seed_idx = np.array([self._track_index[s] for s in seeds if s in self._track_index], dtype=np.int64)
+            if len(seed_idx) == 0:
+                return []
+            seed_weights = np.maximum(plays[seed_idx], 1.0)
+            seed_weights /= seed_weights.sum()
+
+            scores = np.zeros(n)
+            for i, weight in zip(seed_idx, seed_weights):
+                neighbours, row_scores = self._normalized_row(self._track_links, self._track_plays, int(i))
+                np.add.at(scores, neighbours, weight * row_scores)
+
+            if self._features is not None and content_weight:
+                features = self._features
+                in_features = seed_idx < len(features)
+                profile = (seed_weights[in_features] @ features[seed_idx[in_features]]).astype(np.float32)
+                scores[:len(features)] += content_weight * (features @ profile)
+
+            scores[seed_idx] = 0.0
+            candidates = np.flatnonzero(scores > 0)
+            return [(self.track_ids[j], score) for j, score in self._top_k(candidates, scores[candidates], k)]
+
+    @staticmethod
+    def _links_to_csr(links: list[dict[int, float]]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Flatten link dictionaries into CSR arrays (indptr, indices, weights)."""
+        lengths = np.fromiter(map(len, links), dtype=np.int64, count=len(links))
+        indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        indices = np.fromiter(chain.from_iterable(links), dtype=np.int32, count=int(indptr[-1]))
+        weights = np.fromiter(chain.from_iterable(row.values() for row in links), dtype=np.float32,
+                              count=int(indptr[-1]))
+        return indptr, indices, weights
+
+    @staticmethod
+    def _csr_to_links(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray) -> list[dict[int, float]]:
+        """Rebuild link dictionaries from CSR arrays."""
+        indices, weights, bounds = indices.tolist(), weights.tolist(), indptr.tolist()
+        return [dict(zip(indices[start:end], weights[start:end])) for start, end in zip(bounds, bounds[1:])]
+
+    def save(self, path: str = SIMILARITY_INDEX_PATH) -> None:
+        """Write the index to a NumPy archive through an atomic rename.
+
+        Track and artist links are stored as CSR sparse matrix arrays.
+
+        Content features are not saved; rebuild them after loading.
+
+        Args:
+            path: Path of the ``.npz`` file
+        """
+        path = Path(path)
+        with self._lock:
+            artist_counts = [len(artists) for artists in self._track_artists]
+            arrays = {
+                "track_ids": np.array(self.track_ids, dtype=str),
+                "artists": np.array(self.artists, dtype=str),
+                "track_plays": self._track_plays[:len(self.track_ids)],
+                "artist_plays": self._artist_plays[:len(self.artists)],
+                "track_artist_indptr": np.concatenate([[0], np.cumsum(artist_counts)]).astype(np.int64),
+                "track_artist_indices": np.array([a for artists in self._track_artists for a in artists],
+                                                 dtype=np.int64),
+            }
+            for name, links in (("track_links", self._track_links), ("artist_links", self._artist_links)):
+                arrays[f"{name}_indptr"], arrays[f"{name}_indices"], arrays[f"{name}_weights"] = \
+                    self._links_to_csr(links)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as file:
+            np.savez(file, **arrays)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved similarity index with {len(arrays['track_ids'])} tracks to {path}")
+
+    @classmethod
+    def load(cls, path: str = SIMILARITY_INDEX_PATH, **kwargs: Any) -> "SimilarityIndex":
+        """Load an index written by ``save``.
+
+        Args:
+            path: Path of the ``.npz`` file
+            **kwargs: Arguments passed to the constructor
+
+        Returns:
+            SimilarityIndex: The loaded index
+        """
+        index = cls(**kwargs)
+        with np.load(path) as data:
+            index.track_ids = data["track_ids"].tolist()
+            index.artists = data["artists"].tolist()
+            index._track_index = {song_id: i for i, song_id in enumerate(index.track_ids)}
+            index._artist_index = {name: a for a, name in enumerate(index.artists)}
+            index._track_plays = data["track_plays"].astype(np.float64)
+            index._artist_plays = data["artist_plays"].astype(np.float64)
+            indptr, indices = data["track_artist_indptr"], data["track_artist_indices"].tolist()
+            index._track_artists = [indices[indptr[i]:indptr[i + 1]] for i in range(len(index.track_ids))]
+            index._track_links = cls._csr_to_links(data["track_links_indptr"], data["track_links_indices"],
+                                                   data["track_links_weights"])
+            index._artist_links = cls._csr_to_links(data["artist_links_indptr"], data["artist_links_indices"],
+                                                    data["artist_links_weights"])
+        logger.info(f"Loaded similarity index with {len(index.track_ids)} tracks from {path}")
+        return index
+
+    @classmethod
+    def load_or_create(cls, path: str = SIMILARITY_INDEX_PATH,
+                       songs_csv_path: Optional[str] = SONGS_CSV_PATH) -> "SimilarityIndex":
+        """Load the index at ``path``, or create one seeded from the song store if there is none.
+
+        Args:
+            path: Path of the ``.npz`` file
+            songs_csv_path: Song store used to seed a new index, or None to start empty
+
+        Returns:
+            SimilarityIndex: The loaded or new index
+        """
+        if Path(path).exists():
+            return cls.load(path)
+        index = cls()
+        if songs_csv_path and Path(songs_csv_path).exists():
+            from song_tracker import SongTracker
+
+            # Read-only: seeding must never recover or rewrite the store behind its writers' backs
+            index.observe_counts(SongTracker(songs_csv_path, shared=SHARED_STORE, read_only=True).df)
+        return index
+
+    @classmethod
+    def merge_into_file(cls, delta: "SimilarityIndex", path: str = SIMILARITY_INDEX_PATH,
+                        songs_csv_path: Optional[str] = SONGS_CSV_PATH,
+                        delta_in_store: bool = False) -> "SimilarityIndex":
+        """Merge ``delta`` into the index file under an exclusive lock on ``<path>.lock``.
+
+        The file is loaded (or created, see ``load_or_create``) after the lock
+        is taken, so concurrent writers never drop each other's updates.
+
+        Args:
+            delta: Observations not yet in the file
+            path: Path of the ``.npz`` file
+            songs_csv_path: Song store used to seed a new index
+            delta_in_store: Whether the plays in ``delta`` are already counted in the
+                song store, so a newly seeded index only takes their links
+
+        Returns:
+            SimilarityIndex: The merged index as saved
+        """
+        with FileLock(f"{path}.lock"):
+            seeded = not Path(path).exists()
+            index = cls.load_or_create(path, songs_csv_path)
+            index.merge(delta, counts=not (seeded and delta_in_store))
+            index.save(path)
+        return index
+
+
+class SimilarityIndexSink(EventSink):
+    """Event sink that collects plays and periodically merges them into the index file.
+
+    The first batch is merged right away, creating the index file from the
+    song store if it is missing. The tracker records plays in the store
+    before publishing them, so a new index does not count them twice.
+
+    Args:
+        path: Path of the index file
+        save_interval: Minimum time in seconds between saves
+        songs_csv_path: Song store used to seed a new index file
+    """
+
+    name = "index"
+
+    def __init__(self, path: str = SIMILARITY_INDEX_PATH, save_interval: float = INDEX_SAVE_INTERVAL_SEC,
+                 songs_csv_path: Optional[str] = SONGS_CSV_PATH) -> None:
+        """Start collecting plays; files are only touched by the delivery worker."""
+        self.path = path
+        self.save_interval = save_interval
+        self.songs_csv_path = songs_csv_path
+        self.index = SimilarityIndex()  # Plays not yet merged into the file
+        self._last_save: Optional[float] = None
+        self._dirty = False
+
+    def send(self, events: list[dict[str, Any]]) -> None:
+        for event in events:
+            self.index.observe_play(event["song_id"], event["artists"], event["played_at"])
+        self._dirty = True
+        if self._last_save is None or time.monotonic() - self._last_save >= self.save_interval:
+            try:
+                self._save()
+            except Exception as e:
+                # The plays are already observed; raising would make the worker deliver them again
+                logger.error(f"Failed to save similarity index {self.path}, retrying at the next save: {e}")
+                self._last_save = time.monotonic()
+
+    def _save(self) -> None:
+        SimilarityIndex.merge_into_file(self.index, self.path, self.songs_csv_path, delta_in_store=True)
+        self.index.reset_counts()
+        self._last_save = time.monotonic()
+        self._dirty = False
+
+    def close(self) -> None:
+        if not self._dirty:
+            return
+        try:
+            self._save()
+        except Exception as e:
+            # Raising would keep EventPublisher.close from stopping the remaining sinks
+            logger.error(f"Failed to save similarity index {self.path}, unsaved plays are lost: {e}")
+
+
+def main() -> None:
+    """Update the index from export files given on the command line and print recommendations."""
+    from history_importer import find_export_files
+    from metadata_enricher import MetadataCache
+
+    if len(sys.argv) > 1:
+        delta = SimilarityIndex()
+        delta.observe_history(find_export_files(sys.argv[1:]))
+        index = SimilarityIndex.merge_into_file(delta)
+    else:
+        index = SimilarityIndex.load_or_create()
+
+    index.build_content_features(MetadataCache())
+    for song_id, score in index.recommend(k=20):
+        print(f"{song_id}\t{score:.4f}")
+
+
+if __name__ == "__main__":
+    main()
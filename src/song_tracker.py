@@ -1,55 +1,205 @@
 """
 This module provides the SongTracker class for managing song tracking and CSV operations.
 """
+import hashlib
+import io
+import os
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 import pandas as pd
+from definitions import SNAPSHOT_GENERATIONS
+from diagnostics import phase_timer
+from file_lock import FileLock
 from logger import logger
 
 class SongTracker:
-    """Handles tracking and updating song information in the CSV file."""
+    """Handles tracking and updating song information in the CSV file.
+
+    In shared mode several processes may track into the same CSV file. Every
+    update then holds an exclusive lock on ``<csv>.lock``, reloads the file if
+    another process changed it, applies the change and saves before releasing
+    the lock, so no process overwrites counts written by another.
+
+    In read-only mode the newest valid snapshot is loaded without recovering,
+    quarantining or creating any file, and saving raises.
+    """
     
-    def __init__(self, csv_path: str) -> None:
+    def __init__(self, csv_path: str, shared: bool = False, read_only: bool = False) -> None:
         """Initialize the SongTracker with the path to the CSV file.
         
         Args:
             csv_path: Path to the CSV file for storing song data
+            shared: Whether other processes may write to the same CSV file
+            read_only: Whether to only read the store, e.g. for analytics
+
+        Raises:
+            ValueError: In read-only mode, if snapshots exist but none is valid
         """
         self.csv_path = Path(csv_path)
         self.df: Optional[pd.DataFrame] = None
-        self._initialize_csv()
+        self.shared = shared
+        self.read_only = read_only
+        self._file_lock = FileLock(self.csv_path.with_name(self.csv_path.name + '.lock')) if shared else None
+        self._lock_depth = 0
+        self._loaded_stat: Optional[tuple[int, int, int]] = None
+        with self._store_lock(refresh=False):
+            self._initialize_csv()
     
     def _initialize_csv(self) -> None:
         """Initialize or load the CSV file with proper error handling."""
         try:
-            if not self.csv_path.exists():
-                self._create_new_csv()
+            if not any(path.exists() for path in self._snapshot_paths()):
+                if self.read_only:
+                    self.df = self._empty_songs()
+                else:
+                    self._create_new_csv()
             else:
                 self._load_existing_csv()
         except Exception as e:
             logger.error(f"Failed to initialize CSV at {self.csv_path}: {e}")
             raise
 
+    def _file_stat(self) -> Optional[tuple[int, int, int]]:
+        """Return an identity of the current CSV file that changes on every save."""
+        try:
+            stat = self.csv_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    @contextmanager
+    def _store_lock(self, refresh: bool = True) -> Iterator[None]:
+        """Hold the cross-process store lock in shared mode; a no-op otherwise.
+
+        The lock is re-entrant within this tracker. On the outermost
+        acquisition the DataFrame is reloaded if another process saved since
+        this tracker last loaded or saved it.
+
+        Args:
+            refresh: Whether to reload changes made by other processes
+        """
+        if self._file_lock is None or self._lock_depth:
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+            return
+
+        start = time.perf_counter()
+        self._file_lock.acquire()
+        self._lock_depth += 1
+        try:
+            logger.debug(f"Acquired store lock in {(time.perf_counter() - start) * 1000:.1f}ms")
+            if refresh and self._file_stat() != self._loaded_stat:
+                logger.debug("Song file changed by another process, reloading")
+                self._load_existing_csv()
+            yield
+        finally:
+            self._lock_depth -= 1
+            self._file_lock.release()
+
     def _create_new_csv(self) -> None:
         """Create a new CSV file with the required structure."""
-        self.df = pd.DataFrame(columns=['Song', 'Artists', 'Count'])
-        self.df.index.name = 'Song_ID'
+        self.df = self._empty_songs()
         self._save_csv()
         logger.info(f"Created new song tracking file at {self.csv_path}")
 
+    @staticmethod
+    def _empty_songs() -> pd.DataFrame:
+        """Return an empty song table with the required structure."""
+        df = pd.DataFrame(columns=['Song', 'Artists', 'Count'])
+        df.index.name = 'Song_ID'
+        return df
+
+    def _snapshot_paths(self) -> list[Path]:
+        """Return the current CSV path followed by its previous generations, newest first."""
+        return [self.csv_path] + [self._generation_path(i) for i in range(1, SNAPSHOT_GENERATIONS + 1)]
+
+    def _generation_path(self, generation: int) -> Path:
+        """Return the path of a previous snapshot generation."""
+        return self.csv_path.with_name(f"{self.csv_path.name}.{generation}")
+
+    @staticmethod
+    def _checksum_path(path: Path) -> Path:
+        """Return the path of the checksum file belonging to a snapshot."""
+        return path.with_name(path.name + '.sha256')
+
+    def _read_snapshot(self, path: Path) -> pd.DataFrame:
+        """Read and validate a single snapshot.
+
+        Snapshots written before checksums were introduced have no checksum
+        file and are accepted if they parse.
+
+        Args:
+            path: Path of the snapshot to read
+
+        Returns:
+            pd.DataFrame: The songs stored in the snapshot
+
+        Raises:
+            ValueError: If the checksum does not match or required columns are missing
+        """
+        data = path.read_bytes()
+        checksum_path = self._checksum_path(path)
+        if checksum_path.exists():
+            expected = checksum_path.read_text(encoding='utf-8').split()[0]
+            if hashlib.sha256(data).hexdigest() != expected:
+                raise ValueError("checksum mismatch")
+
+        df = pd.read_csv(io.BytesIO(data), index_col='Song_ID')
+        required_columns = {'Song', 'Artists', 'Count'}
+        if not required_columns.issubset(df.columns):
+            raise ValueError(f"CSV file is missing required columns: {required_columns - set(df.columns)}")
+        return df
+
     def _load_existing_csv(self) -> None:
-        """Load an existing CSV file with validation."""
-        try:
-            self.df = pd.read_csv(self.csv_path, index_col='Song_ID')
-            required_columns = {'Song', 'Artists', 'Count'}
-            if not required_columns.issubset(self.df.columns):
-                raise ValueError(f"CSV file is missing required columns: {required_columns - set(self.df.columns)}")
-            logger.info(f"Loaded existing song tracking file with {len(self.df)} entries")
-        except Exception as e:
-            logger.error(f"Error loading CSV file: {e}")
-            # Create backup before potentially overwriting
-            self._backup_csv()
-            self._create_new_csv()
+        """Load the newest valid snapshot, falling back to previous generations."""
+        start = time.perf_counter()
+        invalid = []
+        for path in self._snapshot_paths():
+            if not path.exists():
+                continue
+            try:
+                self.df = self._read_snapshot(path)
+            except Exception as e:
+                logger.error(f"Invalid song snapshot {path}: {e}")
+                invalid.append(path)
+                continue
+
+            logger.info(f"Loaded song tracking file {path} with {len(self.df)} entries "
+                        f"in {time.perf_counter() - start:.2f}s")
+            self._loaded_stat = self._file_stat()
+            if path != self.csv_path:
+                logger.warning(f"Recovered song history from previous snapshot {path}")
+                if not self.read_only:
+                    # Damaged newer snapshots must not take up generations when the recovered data is saved
+                    self._quarantine_snapshots(invalid)
+                    self._save_csv()
+            return
+
+        if self.read_only:
+            raise ValueError(f"No valid snapshot of {self.csv_path}")
+
+        # Nothing is recoverable: keep the damaged files aside instead of overwriting them
+        self._quarantine_snapshots(invalid)
+        self._create_new_csv()
+
+    def _quarantine_snapshots(self, paths: list[Path]) -> None:
+        """Move damaged snapshots and their checksums aside as ``<name>.corrupt-<timestamp>``."""
+        suffix = time.strftime('%Y%m%d%H%M%S')
+        for path in paths:
+            quarantine_path = path.with_name(f"{path.name}.corrupt-{suffix}")
+            counter = 1
+            while quarantine_path.exists():
+                quarantine_path = path.with_name(f"{path.name}.corrupt-{suffix}-{counter}")
+                counter += 1
+            os.replace(path, quarantine_path)
+            if self._checksum_path(path).exists():
+                os.replace(self._checksum_path(path), self._checksum_path(quarantine_path))
+            logger.error(f"Moved unreadable snapshot to {quarantine_path}")
 
     def _backup_csv(self) -> None:
         """Create a backup of the current CSV file."""
@@ -61,8 +211,57 @@ class SongTracker:
         except Exception as e:
             logger.error(f"Failed to create backup: {e}")
 
+    @staticmethod
+    def _write_synced(path: Path, data: bytes) -> None:
+        """Write a file and flush it to disk."""
+        with open(path, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _rotate_snapshots(self) -> None:
+        """Shift the current CSV and its generations one step back, dropping the oldest.
+
+        Without a current CSV (e.g. after it was quarantined) nothing is shifted,
+        so no valid generation is dropped.
+        """
+        paths = self._snapshot_paths()
+        if not paths[0].exists():
+            return
+        for older, newer in reversed(list(zip(paths[1:], paths[:-1]))):
+            for src, dst in ((newer, older), (self._checksum_path(newer), self._checksum_path(older))):
+                if src.exists():
+                    os.replace(src, dst)
+                elif dst.exists():
+                    dst.unlink()
+
+    def _write_snapshot(self) -> None:
+        """Write the DataFrame as a new checksummed snapshot generation.
+
+        The data is fully written and synced before the previous snapshot is
+        rotated out, so a crash at any point leaves a valid generation behind.
+        """
+        data = self.df.to_csv().encode('utf-8')
+        checksum = f"{hashlib.sha256(data).hexdigest()}  {self.csv_path.name}\n".encode('utf-8')
+        checksum_path = self._checksum_path(self.csv_path)
+        tmp_path = self.csv_path.with_name(f"{self.csv_path.name}.{os.getpid()}.tmp")
+        tmp_checksum_path = checksum_path.with_name(f"{checksum_path.name}.{os.getpid()}.tmp")
+        self._write_synced(tmp_path, data)
+        self._write_synced(tmp_checksum_path, checksum)
+
+        self._rotate_snapshots()
+        os.replace(tmp_path, self.csv_path)
+        os.replace(tmp_checksum_path, checksum_path)
+        self._loaded_stat = self._file_stat()
+
     def _save_csv(self) -> None:
-        """Save the DataFrame to CSV with error handling and retries."""
+        """Save the DataFrame to CSV with error handling and retries.
+
+        Raises:
+            RuntimeError: If the tracker is read-only
+        """
+        if self.read_only:
+            raise RuntimeError(f"Cannot save read-only song store {self.csv_path}")
         if self.df is None:
             logger.error("Cannot save: DataFrame is None")
             return
@@ -73,7 +272,8 @@ class SongTracker:
                 # Ensure the directory exists
                 self.csv_path.parent.mkdir(parents=True, exist_ok=True)
                 # Save with index (Song_ID)
-                self.df.to_csv(self.csv_path)
+                with phase_timer.phase("persistence"):
+                    self._write_snapshot()
                 return  # Success
             except Exception as e:
                 if attempt == max_retries - 1:  # Last attempt
@@ -92,18 +292,19 @@ class SongTracker:
         """
         if not all([song_id, song_name, artists]):
             raise ValueError("song_id, song_name, and artists are required")
-            
-        if song_id in self.df.index:
-            self.update_song_counter(song_id)
-            return
-            
-        try:
-            self.df.loc[song_id] = [song_name, artists, 1]
-            self._save_csv()
-            logger.info(f"Added new song: {song_name} by {', '.join(artists)}")
-        except Exception as e:
-            logger.error(f"Failed to add song {song_name}: {e}")
-            raise
+
+        with self._store_lock():
+            if song_id in self.df.index:
+                self.update_song_counter(song_id)
+                return
+
+            try:
+                self.df.loc[song_id] = [song_name, artists, 1]
+                self._save_csv()
+                logger.info(f"Added new song: {song_name} by {', '.join(artists)}")
+            except Exception as e:
+                logger.error(f"Failed to add song {song_name}: {e}")
+                raise
 
     def update_song_counter(self, song_id: str) -> None:
         """Increment the play counter for a song.
@@ -111,19 +312,43 @@ class SongTracker:
         Args:
             song_id: ID of the song to update
         """
-        if self.df is None:
-            logger.error("Cannot update counter: DataFrame is not initialized")
-            return
-            
-        if song_id not in self.df.index:
-            logger.warning(f"Song ID {song_id} not found for counter update")
+        with self._store_lock():
+            if self.df is None:
+                logger.error("Cannot update counter: DataFrame is not initialized")
+                return
+
+            if song_id not in self.df.index:
+                logger.warning(f"Song ID {song_id} not found for counter update")
+                return
+
+            try:
+                current_count = self.df.at[song_id, 'Count']
+                self.df.at[song_id, 'Count'] = current_count + 1
+                self._save_csv()
+                logger.debug(f"Updated counter for song ID {song_id} to {current_count + 1}")
+            except Exception as e:
+                logger.error(f"Failed to update counter for song ID {song_id}: {e}")
+                raise
+
+    def merge_counts(self, counts: pd.DataFrame) -> None:
+        """Add aggregated play counts to the store in a single write.
+
+        Counts of songs already tracked are added to their existing counter;
+        other songs are appended.
+
+        Args:
+            counts: DataFrame indexed by song ID with 'Song', 'Artists' and 'Count' columns
+        """
+        if counts.empty:
             return
-            
-        try:
-            current_count = self.df.at[song_id, 'Count']
-            self.df.at[song_id, 'Count'] = current_count + 1
+
+        with self._store_lock():
+            known = counts.index.isin(self.df.index)
+            existing = counts.loc[known, 'Count']
+            self.df.loc[existing.index, 'Count'] = self.df.loc[existing.index, 'Count'] + existing
+            added = counts.loc[~known, ['Song', 'Artists', 'Count']]
+            self.df = pd.concat([self.df, added]) if not self.df.empty else added.copy()
+            self.df.index.name = 'Song_ID'
             self._save_csv()
-            logger.debug(f"Updated counter for song ID {song_id} to {current_count + 1}")
-        except Exception as e:
-            logger.error(f"Failed to update counter for song ID {song_id}: {e}")
-            raise
+            logger.info(f"Merged {int(counts['Count'].sum())} plays: "
+                        f"{int(known.sum())} existing songs updated, {int((~known).sum())} added")
@@ -1,10 +1,14 @@
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
 from definitions import *
+from diagnostics import phase_timer
 from logger import logger
 from models import AuthSpotify, CurrentSongInfo
 from spotify_api import SpotifyAPI
 
+if TYPE_CHECKING:
+    from auth_server import AuthServer
+
 
 class Spotify:
     """A client for interacting with the Spotify Web API.
@@ -13,9 +17,10 @@ class Spotify:
     various types of music data including artist information, tracks, and user's
     listening history.
     """
-    def __init__(self, auth_spotify: AuthSpotify, user: bool = False) -> None:
+    def __init__(self, auth_spotify: AuthSpotify, user: bool = False,
+                 auth_server: Optional["AuthServer"] = None) -> None:
         """Initialize the Spotify client with empty tokens."""
-        self.spotify_api = SpotifyAPI(auth_spotify, user)
+        self.spotify_api = SpotifyAPI(auth_spotify, user, auth_server)
 
     def search_artist(self, artist_name: str) -> Dict[str, Any]:
         """Search for an artist by name.
@@ -54,13 +59,14 @@ class Spotify:
             logger.info("Podcast is currently playing instead of a song.")
             return None
 
-        song_info = CurrentSongInfo(
-            progress_ms = response["progress_ms"],
-            artists = [artist["name"] for artist in response["item"]["album"]["artists"]],
-            song_name= response["item"]["name"],
-            song_id= response["item"]["id"],
-            play_status = response["is_playing"]
-        )
+        with phase_timer.phase("parse"):
+            song_info = CurrentSongInfo(
+                progress_ms = response["progress_ms"],
+                artists = [artist["name"] for artist in response["item"]["album"]["artists"]],
+                song_name= response["item"]["name"],
+                song_id= response["item"]["id"],
+                play_status = response["is_playing"]
+            )
 
         logger.info(f"Retrieved information for current song: {song_info.song_name}, {song_info.artists}, "
                     f"{song_info.progress_ms}")
@@ -1,20 +1,31 @@
 import base64
+import time
 from http import HTTPStatus
-from typing import Any
+from typing import TYPE_CHECKING, Any, Optional
 
 import requests
 
 from requests import HTTPError
 
-from auth_server import AuthServer
-from definitions import TOKEN_URL, DEFAULT_REQUEST_TIMEOUT_SEC, SEARCH_ENDPOINT, CURRENTLY_PLAYING_ENDPOINT
+from definitions import (TOKEN_URL, DEFAULT_REQUEST_TIMEOUT_SEC, SEARCH_ENDPOINT, CURRENTLY_PLAYING_ENDPOINT,
+                         SEVERAL_TRACKS_ENDPOINT, SEVERAL_ARTISTS_ENDPOINT, SEVERAL_ITEMS_LIMIT,
+                         AUTH_TIMEOUT_SEC, HEADLESS, SPOTIFY_AUTH_CODE, SPOTIFY_REFRESH_TOKEN)
+from diagnostics import phase_timer
 from logger import logger
 from models import AuthSpotify, SpotifyTokens
+from token_store import TokenStore
+
+if TYPE_CHECKING:
+    from auth_server import AuthServer
 
 
 class SpotifyAPI:
-    def __init__(self, auth_spotify: AuthSpotify, user: bool = False) -> None:
+    def __init__(self, auth_spotify: AuthSpotify, user: bool = False,
+                 auth_server: Optional["AuthServer"] = None,
+                 token_store: Optional[TokenStore] = None) -> None:
         self.auth_spotify = auth_spotify
+        self.auth_server = auth_server
+        self.token_store = token_store or TokenStore()
         self.access_tokens: SpotifyTokens = self._get_token() if not user else self._get_user_token()
 
     def __create_auth_base64(self) -> str:
@@ -57,8 +68,13 @@ class SpotifyAPI:
             refresh_token=response.json().get("refresh_token", "")
         )
 
-    def _get_user_token(self, timeout: int = DEFAULT_REQUEST_TIMEOUT_SEC) -> SpotifyTokens:
-        """Get user access token using authorization code flow.
+    def _request_user_token(self, form: dict[str, str],
+                            timeout: int = DEFAULT_REQUEST_TIMEOUT_SEC) -> SpotifyTokens:
+        """Exchange an authorization grant for user tokens.
+
+        Args:
+            form: Token request form with the grant type and its parameters.
+            timeout: The maximum number of seconds to wait for the request to complete.
 
         Returns:
             SpotifyTokens: Object containing access and refresh tokens
@@ -71,23 +87,136 @@ class SpotifyAPI:
             "Content-Type": "application/x-www-form-urlencoded"
         }
 
-        server = AuthServer(scope=" ".join(self.auth_spotify.scope))
+        try:
+            response = requests.post(url=TOKEN_URL,
+                                     headers=headers,
+                                     data=form,
+                                     timeout=timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            raise HTTPError(f"Failed to get user token: {e}") from e
+
+        return SpotifyTokens(
+            access_token=response.json()["access_token"],
+            # Spotify may omit the refresh token when refreshing; the old one stays valid
+            refresh_token=response.json().get("refresh_token", form.get("refresh_token", ""))
+        )
 
-        form = {
+    def _refresh_user_token(self, refresh_token: str) -> SpotifyTokens:
+        """Get a fresh access token from a refresh token."""
+        return self._request_user_token({"grant_type": "refresh_token", "refresh_token": refresh_token})
+
+    def _exchange_auth_code(self, code: str) -> SpotifyTokens:
+        """Get user tokens from an authorization code."""
+        return self._request_user_token({
             "grant_type": "authorization_code",
-            "code": server.callback(),
+            "code": code,
             "redirect_uri": self.auth_spotify.redirect_uri,
-        }
+        })
+
+    def _get_user_token(self) -> SpotifyTokens:
+        """Get user access token using authorization code flow.
+
+        Credentials are tried in this order, so that server deployments can
+        start without any interactive step:
+        1. A refresh token from SPOTIFY_REFRESH_TOKEN
+        2. A refresh token from the token store
+        3. An authorization code from SPOTIFY_AUTH_CODE, unless it was
+           already exchanged (codes are single-use)
+        4. In headless mode, the authorization URL is logged and the token
+           store is polled until another process or an operator writes a
+           working refresh token
+        5. Otherwise, the browser-based flow; a shared, already running
+           ``auth_server`` lets several users onboard concurrently
+
+        A rejected refresh token or code falls through to the next source.
+        The resulting tokens are written to the token store for the next start.
+
+        Returns:
+            SpotifyTokens: Object containing access and refresh tokens
+
+        Raises:
+            HTTPError: If the token request fails
+        """
+        rejected: set[str] = set()
+        tokens = self._get_bootstrap_token(rejected)
+        if tokens is None:
+            # The OAuth flow and its dependencies are only loaded when no stored credentials work
+            from auth_server import AuthServer
+
+            scope = " ".join(self.auth_spotify.scope)
+            server = self.auth_server or AuthServer(scope=scope)
+            if HEADLESS:
+                auth_url, _ = server.get_auth_url(scope)
+                logger.warning(f"Headless mode: authorize at {auth_url} and write the tokens to "
+                               f"{self.token_store.path}, or set SPOTIFY_AUTH_CODE.")
+                tokens = self._wait_for_stored_token(rejected)
+            else:
+                tokens = self._exchange_auth_code(server.callback(timeout=AUTH_TIMEOUT_SEC, scope=scope))
 
-        response = requests.post(url=TOKEN_URL,
-                                 headers=headers,
-                                 data=form,
-                                 timeout=timeout)
         logger.info("User access token retrieved.")
-        return SpotifyTokens(
-            access_token=response.json()["access_token"],
-            refresh_token=response.json().get("refresh_token", "")
-        )
+        if tokens.refresh_token:
+            self.token_store.save(tokens)
+        return tokens
+
+    def _get_bootstrap_token(self, rejected: set[str]) -> Optional[SpotifyTokens]:
+        """Get user tokens from pre-obtained credentials without user interaction.
+
+        Args:
+            rejected: Collects the refresh tokens Spotify rejected
+
+        Returns:
+            Optional[SpotifyTokens]: Tokens, or None if no usable credentials are configured
+        """
+        if SPOTIFY_REFRESH_TOKEN:
+            try:
+                logger.info("Using refresh token from environment.")
+                return self._refresh_user_token(SPOTIFY_REFRESH_TOKEN)
+            except HTTPError as e:
+                logger.warning(f"Refresh token from environment rejected, falling back to the token store: {e}")
+                rejected.add(SPOTIFY_REFRESH_TOKEN)
+
+        stored = self.token_store.load()
+        if stored is not None and stored.refresh_token not in rejected:
+            try:
+                logger.info(f"Using refresh token from {self.token_store.path}.")
+                return self._refresh_user_token(stored.refresh_token)
+            except HTTPError as e:
+                logger.warning(f"Stored refresh token rejected, falling back to authorization: {e}")
+                rejected.add(stored.refresh_token)
+
+        if SPOTIFY_AUTH_CODE and not self.token_store.code_exchanged(SPOTIFY_AUTH_CODE):
+            logger.info("Using authorization code from environment.")
+            try:
+                return self._exchange_auth_code(SPOTIFY_AUTH_CODE)
+            except HTTPError as e:
+                logger.warning(f"Authorization code rejected, falling back to authorization: {e}")
+            finally:
+                # A code is spent by its first exchange, whether it succeeded or not
+                self.token_store.record_exchanged_code(SPOTIFY_AUTH_CODE)
+
+        return None
+
+    def _wait_for_stored_token(self, rejected: set[str]) -> SpotifyTokens:
+        """Poll the token store until it holds a refresh token that Spotify accepts.
+
+        Args:
+            rejected: Refresh tokens already known to be invalid; extended with those rejected while polling
+
+        Returns:
+            SpotifyTokens: Tokens from the first working refresh token
+
+        Raises:
+            TimeoutError: If no working refresh token is written within AUTH_TIMEOUT_SEC
+        """
+        deadline = time.monotonic() + AUTH_TIMEOUT_SEC
+        while True:
+            stored = self.token_store.wait_for_tokens(timeout=deadline - time.monotonic(), rejected=rejected)
+            try:
+                return self._refresh_user_token(stored.refresh_token)
+            except HTTPError as e:
+                logger.warning(f"Refresh token written to {self.token_store.path} was rejected, waiting for another: {e}")
+                rejected.add(stored.refresh_token)
 
     def _get_auth_header(self) -> dict[str, str]:
         """Get authorization header with current access token.
@@ -158,10 +287,75 @@ class SpotifyAPI:
         Raises:
             requests.exceptions.RequestException: If the request fails.
         """
-        response = requests.get(url=CURRENTLY_PLAYING_ENDPOINT,
-                                headers=self._get_auth_header(),
-                                timeout=timeout)
+        with phase_timer.phase("http"):
+            response = requests.get(url=CURRENTLY_PLAYING_ENDPOINT,
+                                    headers=self._get_auth_header(),
+                                    timeout=timeout)
         if HTTPStatus.NO_CONTENT == response.status_code:
             return None
         response.raise_for_status()
-        return response.json()
\ No newline at end of file
+        with phase_timer.phase("parse"):
+            return response.json()
+
+    def _get_several(self, endpoint: str, key: str, ids: list[str],
+                     timeout: int = DEFAULT_REQUEST_TIMEOUT_SEC) -> list[dict[str, Any] | None]:
+        """Fetch several items of one type in a single request.
+
+        Args:
+            endpoint: Batch endpoint URL.
+            key: Top-level key of the response holding the items.
+            ids: Spotify IDs to fetch (at most SEVERAL_ITEMS_LIMIT).
+            timeout: The maximum number of seconds to wait for the request to complete.
+
+        Returns:
+            List[Optional[Dict[str, Any]]]: Items in the order of ``ids``; unknown IDs are None.
+
+        Raises:
+            ValueError: If no IDs or too many IDs are given.
+            requests.exceptions.RequestException: If the request fails.
+        """
+        if not 1 <= len(ids) <= SEVERAL_ITEMS_LIMIT:
+            raise ValueError(f"Between 1 and {SEVERAL_ITEMS_LIMIT} IDs are required, got {len(ids)}")
+
+        response = requests.get(url=endpoint,
+                                headers=self._get_auth_header(),
+                                params={"ids": ",".join(ids)},
+                                timeout=timeout)
+        response.raise_for_status()
+        return response.json().get(key, [])
+
+    def get_several_tracks(self, track_ids: list[str],
+                           timeout: int = DEFAULT_REQUEST_TIMEOUT_SEC) -> list[dict[str, Any] | None]:
+        """
+        Get catalog information for multiple tracks.
+        https://developer.spotify.com/documentation/web-api/reference/get-several-tracks
+
+        Args:
+            track_ids: Spotify track IDs (at most 50).
+            timeout: The maximum number of seconds to wait for the request to complete.
+
+        Returns:
+            List[Optional[Dict[str, Any]]]: Track objects in the order of ``track_ids``.
+
+        Raises:
+            requests.exceptions.RequestException: If the request fails.
+        """
+        return self._get_several(SEVERAL_TRACKS_ENDPOINT, "tracks", track_ids, timeout)
+
+    def get_several_artists(self, artist_ids: list[str],
+                            timeout: int = DEFAULT_REQUEST_TIMEOUT_SEC) -> list[dict[str, Any] | None]:
+        """
+        Get catalog information for multiple artists.
+        https://developer.spotify.com/documentation/web-api/reference/get-multiple-artists
+
+        Args:
+            artist_ids: Spotify artist IDs (at most 50).
+            timeout: The maximum number of seconds to wait for the request to complete.
+
+        Returns:
+            List[Optional[Dict[str, Any]]]: Artist objects in the order of ``artist_ids``.
+
+        Raises:
+            requests.exceptions.RequestException: If the request fails.
+        """
+        return self._get_several(SEVERAL_ARTISTS_ENDPOINT, "artists", artist_ids, timeout)
@@ -0,0 +1,122 @@
+"""
+File-based store for Spotify user tokens.
+
+The store lets tracker instances start without an interactive login: one
+instance (or an operator) writes the tokens once, and every other instance
+reads the refresh token from the shared file at startup.
+"""
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Collection, Optional
+
+from definitions import TOKEN_STORE_PATH, TOKEN_POLL_INTERVAL_SEC
+from logger import logger
+from models import SpotifyTokens
+
+
+class TokenStore:
+    """Reads and atomically writes Spotify tokens in a JSON file.
+
+    Args:
+        path: Path to the JSON token file
+    """
+
+    def __init__(self, path: str = TOKEN_STORE_PATH) -> None:
+        """Initialize the store with the path to the token file."""
+        self.path = Path(path)
+
+    def load(self) -> Optional[SpotifyTokens]:
+        """Load tokens from the store.
+
+        Returns:
+            Optional[SpotifyTokens]: The stored tokens, or None if the file is missing or holds no refresh token
+        """
+        data = self._read()
+        if not data.get("refresh_token"):
+            return None
+        return SpotifyTokens(access_token=data.get("access_token", ""),
+                             refresh_token=data["refresh_token"])
+
+    def save(self, tokens: SpotifyTokens) -> None:
+        """Write tokens to the store, readable by the current user only.
+
+        Args:
+            tokens: Tokens to persist
+        """
+        self._write({**self._read(), **asdict(tokens)})
+        logger.info(f"Saved user tokens to {self.path}")
+
+    def code_exchanged(self, code: str) -> bool:
+        """Check whether an authorization code was already exchanged.
+
+        Args:
+            code: The authorization code
+
+        Returns:
+            bool: True if the code was recorded with ``record_exchanged_code``
+        """
+        return self._read().get("exchanged_code_sha256") == self._hash_code(code)
+
+    def record_exchanged_code(self, code: str) -> None:
+        """Record that an authorization code was used, since Spotify accepts each code only once.
+
+        Only a hash of the code is stored.
+
+        Args:
+            code: The authorization code
+        """
+        self._write({**self._read(), "exchanged_code_sha256": self._hash_code(code)})
+
+    def wait_for_tokens(self, timeout: float, interval: float = TOKEN_POLL_INTERVAL_SEC,
+                        rejected: Collection[str] = ()) -> SpotifyTokens:
+        """Poll the store until tokens appear.
+
+        Args:
+            timeout: Maximum time in seconds to wait
+            interval: Delay in seconds between checks
+            rejected: Refresh tokens known to be invalid; the store is polled until it holds another one
+
+        Returns:
+            SpotifyTokens: The tokens written to the store
+
+        Raises:
+            TimeoutError: If no new tokens appear within the timeout
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            tokens = self.load()
+            if tokens is not None and tokens.refresh_token not in rejected:
+                return tokens
+            time.sleep(interval)
+        raise TimeoutError(f"No tokens written to {self.path} within {timeout:.0f} seconds")
+
+    def _read(self) -> dict[str, Any]:
+        """Read the raw store contents, or an empty dictionary if the file is missing or invalid."""
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logger.warning(f"Ignoring invalid token store {self.path}: {e}")
+            return {}
+        if not isinstance(data, dict):
+            logger.warning(f"Ignoring invalid token store {self.path}: expected a JSON object")
+            return {}
+        return data
+
+    def _write(self, data: dict[str, Any]) -> None:
+        """Atomically replace the store contents, readable by the current user only."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + f".{os.getpid()}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _hash_code(code: str) -> str:
+        return hashlib.sha256(code.encode("utf-8")).hexdigest()